@@ -5,11 +5,15 @@ Usage: Ensure grid files and elev.th are in the specified paths, then run the sc
 """
 
 import os
-import numpy as np
+import sys
 from netCDF4 import Dataset
 from pyschism.mesh.hgrid import Hgrid
 from pyschism.mesh.vgrid import Vgrid
 
+# Shared helpers live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from th_io import read_th
+
 def create_elev2d_th_nc(filename, timeseries_data, hgrid, vgrid):
     """
     Create elev2D.th.nc file from timeseries water elevation data.
@@ -67,7 +71,8 @@ if __name__ == "__main__":
     hgrid = Hgrid.open(hgrid_path, crs='epsg:4326')
     vgrid = Vgrid.open(vgrid_path)
     
-    timeseries_data = np.loadtxt('elev.th')
+    # Parsed once, then memory-mapped from elev.th.npcache/ while elev.th is unchanged
+    timeseries_data = read_th('elev.th')
     
     create_elev2d_th_nc('elev2D.th.nc', timeseries_data, hgrid, vgrid)
     print("elev2D.th.nc file created successfully.")
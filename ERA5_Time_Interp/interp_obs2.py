@@ -1,30 +1,34 @@
+import os
+import sys
 import xarray as xr
-import pandas as pd
 import numpy as np
-from metpy.units import units
-from metpy.calc import wind_components
+
+# Shared helpers live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from time_encoding import to_datetime64, regular_time_axis, datetime64_to_seconds_since_1970
+from time_interp import interpolate_series, check_alignment, TemporalResampler
+from obs_io import read_wind_file
+from wind_utils import wind_components, check_against_metpy, uniform_field
+from forcing_writer import write_forcing
 
 def read_wind_data(filename):
     """
-    Read wind data from file (keeping 30-minute intervals).
+    Read wind data from file (keeping 30-minute intervals), with the date/time
+    columns assembled into a 'datetime' column.
     """
-    df = pd.read_csv(filename, sep='\s+', names=['date', 'time', 'speed', 'direction'])
-    df['speed'] = df['speed'].astype(float)
-    df['direction'] = df['direction'].astype(float)
-    return df
+    return read_wind_file(filename, valid_ranges=None)
 
 def calculate_wind_components(speed, direction):
     """
-    Calculate U and V components using MetPy.
+    Calculate U and V component arrays for whole speed/direction columns.
+    Out-of-range records raise ValueError (no clipping).
     """
-    speed = speed * units('m/s')
-    direction = direction * units('degrees')
-    u, v = wind_components(speed, direction)
-    return float(u.magnitude), float(v.magnitude)
+    return wind_components(speed, direction, clip=False)
 
-def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=17):
+def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=17, max_gap=3600,
+                                   interval=1800, method='linear', block_size=24):
     """
-    Interpolate ERA5 data to 30-minute intervals and replace wind components with observed data.
+    Interpolate ERA5 data to a finer interval and replace wind components with observed data.
 
     Parameters:
     -----------
@@ -34,23 +38,34 @@ def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=17):
         DataFrame containing observed wind speed and direction
     n_timesteps : int
         Number of timesteps to process
+    max_gap : float
+        Longest gap in seconds between observations to interpolate across;
+        output steps in longer gaps or outside the record are masked (NaN)
+    interval : int
+        Output time step in seconds (e.g. 600, 900, 1800)
+    method : str
+        msl interpolation, 'linear' or 'pchip' (monotone cubic)
+    block_size : int
+        Output records resampled per block when msl is written
 
     Returns:
     --------
     xarray.Dataset
-        Dataset with variables interpolated to 30-minute intervals
+        Dataset with the output time axis and observed wind components
+    dict
+        msl block generator, to be written with write_forcing(..., streamed=...)
     """
     print("Processing first {} timesteps...".format(n_timesteps))
 
     # Limit to specified number of timesteps
     ds = ds.isel(valid_time=slice(0, n_timesteps))
 
-    # Create new time array with 30-min intervals
-    time_orig = pd.to_datetime(ds.valid_time.values, unit='s')
-    time_new = pd.date_range(start=time_orig[0], end=time_orig[-1], freq='30min')
-    time_new_unix = (time_new - pd.Timestamp("1970-01-01")) // pd.Timedelta("1s")
+    # Create new time array with the target interval
+    time_orig = to_datetime64(ds.valid_time.values)
+    time_new = regular_time_axis(time_orig[0], time_orig[-1], interval)
+    time_new_unix = datetime64_to_seconds_since_1970(time_new)
 
-    # Calculate number of 30-min intervals
+    # Calculate number of output intervals
     n_new_times = len(time_new_unix)
 
     # Initialize new dataset
@@ -62,51 +77,43 @@ def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=17):
         }
     )
 
-    # First interpolate MSL (pressure) data
-    print("Interpolating msl...")
-    msl_data = ds['msl'].values
-    new_msl = np.zeros((n_new_times,) + msl_data.shape[1:])
-
-    # Interpolate MSL data
-    for i in range(len(msl_data)-1):
-        idx = i * 2
-        new_msl[idx] = msl_data[i]
-        new_msl[idx + 1] = (msl_data[i] + msl_data[i + 1]) / 2
-    new_msl[-1] = msl_data[-1]
-
-    # Add MSL to new dataset
-    ds_new['msl'] = (('valid_time', 'latitude', 'longitude'), new_msl)
-    ds_new['msl'].attrs = ds['msl'].attrs
+    # Interpolate MSL (pressure) data: weights are computed once from the two
+    # time axes, the fields are read and resampled one block at a time when written
+    print(f"Interpolating msl ({method})...")
+    resampler = TemporalResampler(time_orig, time_new, method=method)
+    streamed = {
+        'msl': {
+            'attrs': ds['msl'].attrs,
+            'blocks': resampler.blocks(ds['msl'], 'valid_time', block_size),
+        }
+    }
 
     # Calculate and assign wind components
     print("\nCalculating wind components from observations...")
-    u_data = np.zeros((n_new_times,) + ds['u10'].shape[1:])
-    v_data = np.zeros((n_new_times,) + ds['v10'].shape[1:])
-
-    print(f"Creating new file with {n_new_times} 30-minute timesteps")
+    print(f"Creating new file with {n_new_times} {interval // 60}-minute timesteps")
     print(f"Available wind data has {len(wind_df)} entries")
 
-    # For each new timestep
-    for t in range(n_new_times):
-        wind_idx = t % len(wind_df)
-        speed = wind_df['speed'].iloc[wind_idx]
-        direction = wind_df['direction'].iloc[wind_idx]
-
-        # Calculate wind components
-        u, v = calculate_wind_components(speed, direction)
+    # Calculate wind components for all observations at once
+    u_obs, v_obs = calculate_wind_components(wind_df['speed'].to_numpy(),
+                                             wind_df['direction'].to_numpy())
 
-        # Assign uniform values
-        u_data[t,:,:] = u
-        v_data[t,:,:] = v
+    # Match observations to the output times by timestamp; station winds are
+    # uniform in space, so one value per time step is kept
+    obs_times = wind_df['datetime'].to_numpy()
+    uv, valid = interpolate_series(obs_times, np.column_stack([u_obs, v_obs]),
+                                   time_new, max_gap=max_gap)
+    check_alignment(obs_times, time_new, valid, label='Wind observations')
+    u_series, v_series = uv[:, 0], uv[:, 1]
 
-        print(f"Timestep {t+1}/{n_new_times} - Using wind data entry {wind_idx + 1}")
-        print(f"Wind data: speed={speed:.2f} m/s, direction={direction:.2f}°")
-        print(f"Calculated u={u:.2f} m/s, v={v:.2f} m/s")
+    for t in range(n_new_times):
+        print(f"Timestep {t+1}/{n_new_times} - {time_new[t]}")
+        print(f"Calculated u={u_series[t]:.2f} m/s, v={v_series[t]:.2f} m/s")
         print("-" * 50)
 
-    # Add wind components to new dataset
-    ds_new['u10'] = (('valid_time', 'latitude', 'longitude'), u_data)
-    ds_new['v10'] = (('valid_time', 'latitude', 'longitude'), v_data)
+    # Add wind components to new dataset as broadcast views (no grid-sized copies)
+    grid_shape = ds['u10'].shape[1:]
+    ds_new['u10'] = (('valid_time', 'latitude', 'longitude'), uniform_field(u_series, grid_shape))
+    ds_new['v10'] = (('valid_time', 'latitude', 'longitude'), uniform_field(v_series, grid_shape))
 
     # Copy wind variable attributes
     ds_new['u10'].attrs = ds['u10'].attrs
@@ -132,7 +139,7 @@ def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=17):
     # Copy global attributes
     ds_new.attrs = ds.attrs
 
-    return ds_new
+    return ds_new, streamed
 
 if __name__ == "__main__":
     print("Reading ERA5 data...")
@@ -142,29 +149,18 @@ if __name__ == "__main__":
     print("Reading wind observations...")
     # Read wind data from file
     wind_df = read_wind_data('spd_dir.txt')
+    check_against_metpy(wind_df['speed'].to_numpy(), wind_df['direction'].to_numpy(), clip=False)
 
     print("Performing interpolation and wind component calculation...")
     # Perform interpolation and wind component calculation
-    ds_30min = interpolate_era5_with_obs_wind(ds, wind_df)
-
-    print("Renaming valid_time to time...")
-    # Rename valid_time to time before saving
-    ds_30min = ds_30min.rename({'valid_time': 'time'})
+    ds_30min, streamed = interpolate_era5_with_obs_wind(ds, wind_df)
 
     print("Saving interpolated data...")
-    # Save interpolated data with proper encoding
-    encoding = {
-        'time': {  # Changed from valid_time to time
-            'dtype': 'int64',
-            '_FillValue': None
-        },
-        'u10': {'dtype': 'float32'},
-        'v10': {'dtype': 'float32'},
-        'msl': {'dtype': 'float32'}
-    }
-
-    ds_30min.to_netcdf('era5_data_30min_obs_wind.nc', encoding=encoding)
+    # Variables are created up front (float32, _FillValue -9999, int64 time,
+    # valid_time renamed to time) and filled one time block at a time
+    write_forcing('era5_data_30min_obs_wind.nc', ds_30min, streamed=streamed,
+                  time_dim='valid_time', out_time_dim='time')
 
     print("Done!")
     print(f"Original times: {len(ds.valid_time)} points")
-    print(f"Interpolated times: {len(ds_30min.time)} points")  # Changed to time
+    print(f"Interpolated times: {len(ds_30min.valid_time)} points")
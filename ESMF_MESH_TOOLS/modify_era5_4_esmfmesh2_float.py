@@ -1,8 +1,13 @@
+import os
+import sys
 import xarray as xr
 import numpy as np
-import pandas as pd
 from datetime import datetime
 
+# Shared helpers live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from time_encoding import datetime64_to_hours_since_1900
+
 def process_era5_data(input_file, output_file):
     """
     Process ERA5 data to match the specified NetCDF format, keeping float32 precision
@@ -11,9 +16,7 @@ def process_era5_data(input_file, output_file):
     ds = xr.open_dataset(input_file)
 
     # Convert time to hours since 1900-01-01
-    reference_date = pd.Timestamp('1900-01-01')
-    time_hours = np.array([(pd.Timestamp(t) - reference_date).total_seconds() / 3600
-                          for t in ds.valid_time.values], dtype=np.int32)
+    time_hours = datetime64_to_hours_since_1900(ds.valid_time.values)
 
     # Create new dataset with desired structure
     new_ds = xr.Dataset(
@@ -0,0 +1,175 @@
+"""
+Batch time-series figures for many stations.
+
+Renders one figure per station in the style of water_level_plot_timeseries.py
+and wspd_plot_timeseries.py (max/min annotated) on the headless Agg
+backend, spread over a process pool. Each worker reads its own station, so
+only station ids and file names cross process boundaries.
+
+Stations come from an observation store (obs_store) or from a directory of
+station text files (timestamp followed by value columns, see
+obs_io.read_station_file).
+
+Usage:
+    python plot_stations.py --variable water_level
+    python plot_stations.py --store ../OBS_STORE --stations duck --variable speed \\
+        --start 2012-10-27 --end "2012-10-29 08:30" --output-dir plots
+    python plot_stations.py --directory gauges --columns water_level --skiprows 1 --workers 8
+"""
+
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.dates import DateFormatter
+import numpy as np
+
+# Shared helpers live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from obs_io import OBS_TIME_FORMAT, read_station_file
+from obs_store import ObsStore
+
+OBS_STORE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'OBS_STORE')
+
+# Variable -> (axis label, units)
+VARIABLES = {
+    'water_level': ('Water Level', 'm'),
+    'speed': ('Wind Speed', 'm/s'),
+    'direction': ('Wind Direction', 'degree'),
+}
+
+
+def load_station(source, station, variable, start=None, end=None, columns=None, skiprows=0,
+                 time_format=OBS_TIME_FORMAT):
+    """
+    (times, values, title name, units) of one station from a store
+    directory or a text file.
+    """
+    label, units = VARIABLES.get(variable, (variable, ''))
+    if os.path.isfile(source):
+        df = read_station_file(source, columns, time_format=time_format, skiprows=skiprows)
+        times = df['datetime'].to_numpy()
+        values = df[variable].to_numpy()
+        window = np.ones(len(times), dtype=bool)
+        if start is not None:
+            window &= times >= np.datetime64(start)
+        if end is not None:
+            window &= times <= np.datetime64(end)
+        return times[window], values[window], station, units
+
+    store = ObsStore(source)
+    info = store.info(station)
+    times, values = store.load(station, variable, start, end)
+    units = store.info(station, variable).get('units') or units
+    return times, values, info.get('name', station), units
+
+
+def plot_station(task):
+    """
+    Render one station figure; runs in a worker process. Returns the output
+    file, or None when the station has no data in the window.
+    """
+    times, values, name, units = load_station(**task['source'])
+    if len(times) == 0:
+        return None
+    variable = task['source']['variable']
+    label = VARIABLES.get(variable, (variable, ''))[0]
+    values = np.asarray(values, dtype=np.float64)
+
+    fig, ax1 = plt.subplots(1, 1, figsize=(15, 6))
+    ax1.plot(times, values, 'b-', linewidth=2)
+    ax1.xaxis.set_major_formatter(DateFormatter('%b %d %HZ'))
+    ax1.set_title(f'Observed {label} ({name})', fontsize=12, pad=10)
+    ax1.set_xlabel('Date/Time')
+    ax1.set_ylabel(f'{label} ({units})' if units else label)
+    ax1.grid(True, linestyle='--', alpha=0.7)
+    ax1.tick_params(axis='x', rotation=45)
+
+    i_max = int(np.nanargmax(values))
+    i_min = int(np.nanargmin(values))
+    ax1.annotate(f'Max: {values[i_max]:.1f} {units}',
+                 xy=(times[i_max], values[i_max]),
+                 xytext=(10, 10), textcoords='offset points')
+    ax1.annotate(f'Min: {values[i_min]:.1f} {units}',
+                 xy=(times[i_min], values[i_min]),
+                 xytext=(10, -15), textcoords='offset points')
+
+    fig.tight_layout()
+    fig.savefig(task['output'], dpi=task['dpi'], bbox_inches='tight')
+    plt.close(fig)
+    return task['output']
+
+
+def build_tasks(args):
+    """
+    One task per station: where to read it and where to write the figure.
+    """
+    common = {'variable': args.variable, 'start': args.start, 'end': args.end}
+    sources = []
+    if args.directory:
+        files = sorted(glob.glob(os.path.join(args.directory, args.pattern)))
+        columns = args.columns or [args.variable]
+        if args.variable not in columns:
+            raise ValueError(f"--variable {args.variable} is not one of --columns {columns}")
+        for filename in files:
+            station = os.path.splitext(os.path.basename(filename))[0]
+            if args.stations and station not in args.stations:
+                continue
+            sources.append(dict(common, source=filename, station=station, columns=columns,
+                                skiprows=args.skiprows, time_format=args.time_format))
+    else:
+        store = ObsStore(args.store)
+        stations = args.stations or store.stations(args.variable, args.start, args.end)
+        sources = [dict(common, source=args.store, station=station) for station in stations]
+
+    return [{'source': source, 'dpi': args.dpi,
+             'output': os.path.join(args.output_dir, f"{source['station']}_{args.variable}.png")}
+            for source in sources]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plot observed time series for many stations in parallel')
+    parser.add_argument('--store', default=OBS_STORE, help='Observation store directory')
+    parser.add_argument('--directory', help='Directory of station text files instead of a store')
+    parser.add_argument('--pattern', default='*.txt', help='Station file pattern in --directory')
+    parser.add_argument('--columns', nargs='+', help='Value columns of the station files')
+    parser.add_argument('--skiprows', type=int, default=0, help='Header lines of the station files')
+    parser.add_argument('--time-format', default=OBS_TIME_FORMAT, help='Timestamp format of the station files')
+    parser.add_argument('--stations', nargs='+', help='Station ids (default: all)')
+    parser.add_argument('--variable', default='water_level', help='Variable to plot')
+    parser.add_argument('--start', help='First time to plot')
+    parser.add_argument('--end', help='Last time to plot')
+    parser.add_argument('--output-dir', default='.', help='Directory for the figures')
+    parser.add_argument('--dpi', type=int, default=300, help='Figure resolution')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes')
+    args = parser.parse_args()
+
+    tasks = build_tasks(args)
+    if not tasks:
+        print("No stations to plot")
+        return
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Plotting {len(tasks)} stations with {args.workers} workers...")
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(plot_station, task): task['source']['station'] for task in tasks}
+        for future in as_completed(futures):
+            station = futures[future]
+            try:
+                output = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{station}: failed ({e})")
+                continue
+            print(f"{station}: {output or 'no data in window'}")
+    print(f"Done: {len(tasks) - failed}/{len(tasks)} stations")
+
+
+if __name__ == "__main__":
+    main()
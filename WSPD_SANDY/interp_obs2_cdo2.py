@@ -1,27 +1,57 @@
+import os
+import sys
 import xarray as xr
-import pandas as pd
 import numpy as np
-from metpy.units import units
-from metpy.calc import wind_components
 
-def read_wind_data(filename):
+# Shared helpers live in the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from time_encoding import to_datetime64, regular_time_axis, datetime64_to_seconds_since_1970
+from time_interp import interpolate_series, check_alignment, TemporalResampler
+from obs_io import read_wind_file, WIND_RANGES
+from obs_store import ObsStore
+from obs_qc import qc_series
+from wind_utils import wind_components, check_against_metpy, uniform_field
+from forcing_writer import write_forcing
+from wind_blend import StationBlender
+
+# Largest plausible speed change between consecutive records (m/s); the
+# rate limit follows the record's sampling interval
+WIND_MAX_STEP = 10.0
+# Hampel outliers over a window of this many records are dropped
+WIND_MAD_WINDOW = 9
+WIND_MIN_MAD = 0.5
+
+def qc_wind(df, label='Wind observations', max_step=WIND_MAX_STEP):
+    """
+    Sort wind records by time and drop duplicate timestamps, out-of-range
+    values and speed spikes (obs_qc rate-of-change and rolling-MAD tests).
+
+    The rate test allows max_step m/s per median sampling interval, so
+    1-minute and 30-minute records get the same per-record tolerance.
+    """
+    df = df.sort_values('datetime', kind='stable').reset_index(drop=True)
+    seconds = df['datetime'].to_numpy().astype('datetime64[s]').astype(np.int64)
+    spacing = np.diff(np.unique(seconds))
+    max_rate = max_step / np.median(spacing) if len(spacing) else None
+    _, _, flags = qc_series(seconds, df['speed'].to_numpy(),
+                            valid_range=WIND_RANGES['speed'], max_rate=max_rate,
+                            mad_window=WIND_MAD_WINDOW, min_mad=WIND_MIN_MAD, label=label)
+    low, high = WIND_RANGES['direction']
+    keep = (flags == 0) & (df['direction'] >= low).to_numpy() & (df['direction'] <= high).to_numpy()
+    return df[keep].reset_index(drop=True)
+
+def read_wind_data(filename, use_cache=False):
     """
     Read wind data from file with improved error handling and validation.
+
+    Timestamps are assembled from the date/time columns into a 'datetime'
+    column; records with bad timestamps, missing values or speed/direction
+    outside [0, 100] m/s / [0, 360] degrees are dropped in one pass, then
+    duplicates and speed spikes by qc_wind.
     """
     try:
-        df = pd.read_csv(filename, sep='\s+', names=['date', 'time', 'speed', 'direction'])
-        
-        # Convert to numeric, replacing invalid values with NaN
-        df['speed'] = pd.to_numeric(df['speed'], errors='coerce')
-        df['direction'] = pd.to_numeric(df['direction'], errors='coerce')
-        
-        # Drop any rows with NaN values
-        df = df.dropna()
-        
-        # Validate ranges
-        df = df[(df['speed'] >= 0) & (df['speed'] < 100) &  # reasonable wind speed range
-                (df['direction'] >= 0) & (df['direction'] <= 360)]  # valid direction range
-        
+        df = qc_wind(read_wind_file(filename, use_cache=use_cache), label=filename)
+
         if df.empty:
             raise ValueError("No valid wind data after filtering")
             
@@ -32,20 +62,62 @@ def read_wind_data(filename):
 
 def calculate_wind_components(speed, direction):
     """
-    Calculate U and V components using MetPy with error handling.
+    Calculate U and V component arrays for whole speed/direction columns.
     """
     try:
-        speed = np.clip(speed, 0, 100) * units('m/s')  # clip to reasonable range
-        direction = np.clip(direction, 0, 360) * units('degrees')
-        u, v = wind_components(speed, direction)
-        return float(u.magnitude), float(v.magnitude)
+        # clip to reasonable range, as the validation in read_wind_data
+        return wind_components(speed, direction, clip=True)
     except Exception as e:
         raise Exception(f"Error calculating wind components: {str(e)}")
 
-def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=None):
+def new_output_dataset(ds, time_new_unix):
+    """
+    Output dataset on the new time axis with ERA5's coordinates, attributes and
+    any variables other than u10/v10/msl (those are added or streamed by the caller).
     """
-    Interpolate ERA5 data to 30-minute intervals and replace wind components with observed data.
+    ds_new = xr.Dataset(
+        coords={
+            'valid_time': time_new_unix,
+            'latitude': ds.latitude,
+            'longitude': ds.longitude
+        }
+    )
+
+    # Copy remaining variables
+    for var in ds.variables:
+        if var not in ['u10', 'v10', 'msl', 'valid_time', 'latitude', 'longitude']:
+            ds_new[var] = ds[var]
+
+    # Copy coordinate attributes
+    for coord in ['latitude', 'longitude']:
+        ds_new[coord].attrs = ds[coord].attrs
+
+    # Set time attributes
+    ds_new.valid_time.attrs = {
+        'long_name': 'time',
+        'standard_name': 'time',
+        'units': 'seconds since 1970-01-01',
+        'calendar': 'proleptic_gregorian'
+    }
+
+    # Copy global attributes
+    ds_new.attrs = ds.attrs
+    return ds_new
+
+def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=None, max_gap=3600,
+                                   interval=1800, method='linear', block_size=24):
+    """
+    Interpolate ERA5 data to interval seconds (default 30 minutes) and replace wind
+    components with observed data.
     Added error handling and improved interpolation.
+
+    Observations are matched to the output times by their date/time stamps;
+    steps outside the record or inside gaps longer than max_gap seconds are
+    written as missing.
+
+    msl is resampled with TemporalResampler ('linear' or 'pchip') while it is
+    written, block_size output records at a time. Returns (ds_new, streamed),
+    to be saved with write_forcing(..., streamed=streamed).
     """
     try:
         # Validate inputs
@@ -61,153 +133,184 @@ def interpolate_era5_with_obs_wind(ds, wind_df, n_timesteps=None):
         # Limit to specified number of timesteps
         ds = ds.isel(valid_time=slice(0, n_timesteps))
 
-        # Create new time array with 30-min intervals
-        time_orig = pd.to_datetime(ds.valid_time.values, unit='s')
-        time_new = pd.date_range(start=time_orig[0], end=time_orig[-1], freq='30min')
-        time_new_unix = (time_new - pd.Timestamp("1970-01-01")) // pd.Timedelta("1s")
+        # Create new time array with the target interval
+        time_orig = to_datetime64(ds.valid_time.values)
+        time_new = regular_time_axis(time_orig[0], time_orig[-1], interval)
+        time_new_unix = datetime64_to_seconds_since_1970(time_new)
 
-        # Calculate number of 30-min intervals
+        # Calculate number of output intervals
         n_new_times = len(time_new_unix)
 
         # Initialize new dataset
-        ds_new = xr.Dataset(
-            coords={
-                'valid_time': time_new_unix,
-                'latitude': ds.latitude,
-                'longitude': ds.longitude
+        ds_new = new_output_dataset(ds, time_new_unix)
+
+        # Interpolate MSL (pressure) data: weights are computed once from the two
+        # time axes, the fields are read and resampled one block at a time when written
+        print(f"Interpolating msl ({method})...")
+        resampler = TemporalResampler(time_orig, time_new, method=method)
+        streamed = {
+            'msl': {
+                'attrs': ds['msl'].attrs,
+                'blocks': resampler.blocks(ds['msl'], 'valid_time', block_size),
             }
-        )
-
-        # Interpolate MSL (pressure) data
-        print("Interpolating msl...")
-        msl_data = ds['msl'].values
-        new_msl = np.zeros((n_new_times,) + msl_data.shape[1:])
-
-        # Improved MSL interpolation
-        for i in range(len(msl_data)-1):
-            idx = i * 2
-            new_msl[idx] = msl_data[i]
-            if idx + 1 < n_new_times:
-                new_msl[idx + 1] = (msl_data[i] + msl_data[i + 1]) / 2
-        if n_new_times > 0:
-            new_msl[-1] = msl_data[-1]
-
-        # Add MSL to new dataset
-        ds_new['msl'] = (('valid_time', 'latitude', 'longitude'), new_msl)
-        ds_new['msl'].attrs = ds['msl'].attrs
+        }
 
         # Calculate and assign wind components
         print("\nCalculating wind components from observations...")
-        u_data = np.zeros((n_new_times,) + ds['u10'].shape[1:])
-        v_data = np.zeros((n_new_times,) + ds['v10'].shape[1:])
-
-        print(f"Creating new file with {n_new_times} 30-minute timesteps")
+        print(f"Creating new file with {n_new_times} {interval // 60}-minute timesteps")
         print(f"Available wind data has {len(wind_df)} entries")
 
-        # Create buffer for interpolation
-        wind_buffer = []
-        
-        # Pre-calculate all wind components
-        for i in range(len(wind_df)):
-            speed = wind_df['speed'].iloc[i]
-            direction = wind_df['direction'].iloc[i]
-            u, v = calculate_wind_components(speed, direction)
-            wind_buffer.append((u, v))
-
-        # For each new timestep
-        for t in range(n_new_times):
-            # Use modulo to cycle through wind data, with interpolation
-            wind_idx = t % len(wind_df)
-            next_idx = (wind_idx + 1) % len(wind_df)
-            
-            # Get current and next wind components
-            u_curr, v_curr = wind_buffer[wind_idx]
-            u_next, v_next = wind_buffer[next_idx]
-            
-            # Interpolate if this is an in-between timestep
-            if t % 2 == 1 and t < n_new_times - 1:
-                u = (u_curr + u_next) / 2
-                v = (v_curr + v_next) / 2
-            else:
-                u = u_curr
-                v = v_curr
-
-            # Assign uniform values
-            u_data[t,:,:] = u
-            v_data[t,:,:] = v
-
-            if t % 10 == 0:  # Reduce output frequency
-                print(f"Timestep {t+1}/{n_new_times} - Using wind data entries {wind_idx + 1} and {next_idx + 1}")
-                print(f"Calculated u={u:.2f} m/s, v={v:.2f} m/s")
-
-        # Add wind components to new dataset
-        ds_new['u10'] = (('valid_time', 'latitude', 'longitude'), u_data)
-        ds_new['v10'] = (('valid_time', 'latitude', 'longitude'), v_data)
+        # Pre-calculate all wind components in one pass over the columns
+        u_obs, v_obs = calculate_wind_components(wind_df['speed'].to_numpy(),
+                                                 wind_df['direction'].to_numpy())
+
+        # Match observations to the output times by timestamp; station winds are
+        # uniform in space, so one value per time step is kept
+        obs_times = wind_df['datetime'].to_numpy()
+        uv, valid = interpolate_series(obs_times, np.column_stack([u_obs, v_obs]),
+                                       time_new, max_gap=max_gap)
+        check_alignment(obs_times, time_new, valid, label='Wind observations')
+        u_series, v_series = uv[:, 0], uv[:, 1]
+
+        for t in range(0, n_new_times, 10):  # Reduce output frequency
+            print(f"Timestep {t+1}/{n_new_times} ({time_new[t]}): "
+                  f"u={u_series[t]:.2f} m/s, v={v_series[t]:.2f} m/s")
+
+        # Add wind components to new dataset as broadcast views (no grid-sized copies)
+        grid_shape = ds['u10'].shape[1:]
+        ds_new['u10'] = (('valid_time', 'latitude', 'longitude'), uniform_field(u_series, grid_shape))
+        ds_new['v10'] = (('valid_time', 'latitude', 'longitude'), uniform_field(v_series, grid_shape))
 
         # Copy variable attributes
         ds_new['u10'].attrs = ds['u10'].attrs
         ds_new['v10'].attrs = ds['v10'].attrs
 
-        # Copy remaining variables
-        for var in ds.variables:
-            if var not in ['u10', 'v10', 'msl', 'valid_time', 'latitude', 'longitude']:
-                ds_new[var] = ds[var]
-
-        # Copy coordinate attributes
-        for coord in ['latitude', 'longitude']:
-            ds_new[coord].attrs = ds[coord].attrs
-
-        # Set time attributes
-        ds_new.valid_time.attrs = {
-            'long_name': 'time',
-            'standard_name': 'time',
-            'units': 'seconds since 1970-01-01',
-            'calendar': 'proleptic_gregorian'
-        }
-
-        # Copy global attributes
-        ds_new.attrs = ds.attrs
-
-        return ds_new
+        return ds_new, streamed
 
     except Exception as e:
         raise Exception(f"Error in interpolation: {str(e)}")
 
+def read_station_wind(station, time_new, max_gap=3600):
+    """
+    Wind records of one station as a DataFrame ('datetime', 'speed', 'direction').
+
+    Stations with 'store' (directory) and 'id' are read from an observation
+    store (obs_store), only over the output window plus max_gap on each
+    side; otherwise the text 'file' is read whole.
+    """
+    if 'store' not in station:
+        return read_wind_data(station['file'])
+    pad = np.timedelta64(int(max_gap or 0), 's')
+    wind_df = ObsStore(station['store']).load_frame(station['id'], ['speed', 'direction'],
+                                                    time_new[0] - pad, time_new[-1] + pad)
+    wind_df = qc_wind(wind_df, label=station['name'])
+    if wind_df.empty:
+        raise ValueError(f"No valid wind data for {station['name']} in {station['store']}")
+    return wind_df
+
+def read_station_obs(stations, time_new, max_gap=3600):
+    """
+    Read each station's wind record and align it to time_new.
+
+    Returns (u_obs, v_obs), each (n_times, n_stations) with NaN where a station
+    has no observation within max_gap seconds.
+    """
+    u_obs = np.full((len(time_new), len(stations)), np.nan)
+    v_obs = np.full((len(time_new), len(stations)), np.nan)
+    for k, station in enumerate(stations):
+        wind_df = read_station_wind(station, time_new, max_gap)
+        u, v = calculate_wind_components(wind_df['speed'].to_numpy(),
+                                         wind_df['direction'].to_numpy())
+        obs_times = wind_df['datetime'].to_numpy()
+        uv, valid = interpolate_series(obs_times, np.column_stack([u, v]), time_new,
+                                       max_gap=max_gap)
+        check_alignment(obs_times, time_new, valid, label=f"{station['name']} observations")
+        u_obs[:, k], v_obs[:, k] = uv[:, 0], uv[:, 1]
+    return u_obs, v_obs
+
+def blend_era5_with_obs_wind(ds, stations, n_timesteps=None, max_gap=3600, interval=1800,
+                             method='linear', block_size=24, radius_km=100.0, kernel='gaussian'):
+    """
+    Interpolate ERA5 to interval seconds and nudge u10/v10 toward several stations
+    instead of replacing the whole domain with one station's wind.
+
+    Parameters:
+    -----------
+    ds : xarray.Dataset
+        Input ERA5 dataset
+    stations : list of dict
+        Each with 'name', 'lon', 'lat' and either 'file' (date time speed
+        direction) or 'store' and 'id' (observation store station)
+    radius_km, kernel :
+        Station influence, see wind_blend.StationBlender
+
+    Other parameters as in interpolate_era5_with_obs_wind. Returns
+    (ds_new, streamed); u10, v10 and msl are all produced block by block
+    when written with write_forcing(..., streamed=streamed).
+    """
+    if n_timesteps is None:
+        n_timesteps = len(ds.valid_time)
+    ds = ds.isel(valid_time=slice(0, n_timesteps))
+    print(f"Processing {n_timesteps} timesteps, blending {len(stations)} stations...")
+
+    time_orig = to_datetime64(ds.valid_time.values)
+    time_new = regular_time_axis(time_orig[0], time_orig[-1], interval)
+    ds_new = new_output_dataset(ds, datetime64_to_seconds_since_1970(time_new))
+
+    resampler = TemporalResampler(time_orig, time_new, method=method)
+    u_obs, v_obs = read_station_obs(stations, time_new, max_gap)
+
+    # Station weights are built once; each block is corrected with sparse products
+    blender = StationBlender(ds.longitude.values, ds.latitude.values,
+                             [st['lon'] for st in stations], [st['lat'] for st in stations],
+                             radius_km=radius_km, kernel=kernel,
+                             names=[st['name'] for st in stations])
+
+    streamed = {
+        'u10': {'attrs': ds['u10'].attrs,
+                'blocks': blender.blocks(ds['u10'], u_obs, 'valid_time', resampler, block_size)},
+        'v10': {'attrs': ds['v10'].attrs,
+                'blocks': blender.blocks(ds['v10'], v_obs, 'valid_time', resampler, block_size)},
+        'msl': {'attrs': ds['msl'].attrs,
+                'blocks': resampler.blocks(ds['msl'], 'valid_time', block_size)},
+    }
+    print(f"Creating new file with {len(time_new)} {interval // 60}-minute timesteps")
+    return ds_new, streamed
+
+# 'replace': one station's wind over the whole domain (small domains only)
+# 'blend': nudge ERA5 u10/v10 toward every station in STATIONS
+WIND_MODE = 'replace'
+STATIONS = [
+    {'name': 'Duck, NC (8651370)', 'lon': -75.7467, 'lat': 36.1833,
+     'store': os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'OBS_STORE'), 'id': 'duck'},
+]
+
 if __name__ == "__main__":
     try:
         print("Reading ERA5 data...")
         ds = xr.open_dataset('era5_data_20121027_20121029.nc')
 
-        print("Reading wind observations...")
-        wind_df = read_wind_data('spd_dir2.txt')
-
-        print("Performing interpolation and wind component calculation...")
-        ds_30min = interpolate_era5_with_obs_wind(ds, wind_df)
+        if WIND_MODE == 'blend':
+            print("Blending station observations into ERA5 winds...")
+            ds_30min, streamed = blend_era5_with_obs_wind(ds, STATIONS)
+        else:
+            print("Reading wind observations...")
+            wind_df = read_wind_data('spd_dir2.txt')
+            check_against_metpy(wind_df['speed'].to_numpy(), wind_df['direction'].to_numpy())
 
-        print("Renaming valid_time to time...")
-        ds_30min = ds_30min.rename({'valid_time': 'time'})
-
-        print("Inverting latitudes...")
-        ds_30min = ds_30min.reindex(latitude=ds_30min.latitude[::-1])
-
-        # Flip data arrays along latitude dimension
-        for var in ds_30min.data_vars:
-            if 'latitude' in ds_30min[var].dims:
-                ds_30min[var] = ds_30min[var].reindex(latitude=ds_30min.latitude)
-
-        print("Saving interpolated data...")
-        encoding = {
-            'time': {'dtype': 'int64', '_FillValue': None},
-            'u10': {'dtype': 'float32', '_FillValue': -9999.0},
-            'v10': {'dtype': 'float32', '_FillValue': -9999.0},
-            'msl': {'dtype': 'float32', '_FillValue': -9999.0}
-        }
+            print("Performing interpolation and wind component calculation...")
+            ds_30min, streamed = interpolate_era5_with_obs_wind(ds, wind_df)
 
-        ds_30min.to_netcdf('era5_data_30min_obs_wind_rot_fix_filled.nc', encoding=encoding)
+        # Variables are created up front (float32, _FillValue -9999, int64 time,
+        # valid_time renamed to time) and filled block by block; latitudes are
+        # inverted per block on the way out
+        print("Saving interpolated data with inverted latitudes...")
+        write_forcing('era5_data_30min_obs_wind_rot_fix_filled.nc', ds_30min, streamed=streamed,
+                      time_dim='valid_time', out_time_dim='time', reverse_latitude=True)
 
         print("Done!")
         print(f"Original times: {len(ds.valid_time)} points")
-        print(f"Interpolated times: {len(ds_30min.time)} points")
+        print(f"Interpolated times: {len(ds_30min.valid_time)} points")
 
     except Exception as e:
         print(f"Error in main execution: {str(e)}")
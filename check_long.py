@@ -1,6 +1,8 @@
 import xarray as xr
 import numpy as np
 
+from era5_grid import GridLayout, normalize_file
+
 def check_and_fix_longitude(file_path, output_file=None):
     """
     Check longitude format and convert if needed
@@ -13,21 +15,19 @@ def check_and_fix_longitude(file_path, output_file=None):
     print("First few longitude values:", ds.longitude.values[:10])
     
     # Check if we need to convert
-    if ds.longitude.max() > 180:
+    layout = GridLayout.from_dataset(ds, ascending_latitude=False)
+    if layout.wraps_longitude:
         print("\nConverting longitudes from [0,360] to [-180,180]...")
         
-        # Convert longitude values
-        ds = ds.assign_coords(longitude=(((ds.longitude + 180) % 360) - 180))
-        
-        # Sort by the new longitude values
-        ds = ds.sortby('longitude')
+        # Convert longitude values; columns are reordered lazily in contiguous runs
+        ds = layout.apply(ds)
         
         print("\nAfter conversion:")
         print("Longitude range:", ds.longitude.min().values, "to", ds.longitude.max().values)
         print("First few longitude values:", ds.longitude.values[:10])
         
         if output_file:
-            ds.to_netcdf(output_file)
+            normalize_file(file_path, output_file, layout)
             print(f"\nSaved converted file to: {output_file}")
     else:
         print("\nLongitudes already in [-180,180] format")
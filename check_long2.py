@@ -2,6 +2,8 @@ import xarray as xr
 import numpy as np
 import matplotlib.pyplot as plt
 
+from era5_grid import GridLayout, normalize_file
+
 def check_lat_lon_data(file_path, output_file=None):
     """
     Comprehensive check of latitude and longitude data
@@ -33,16 +35,16 @@ def check_lat_lon_data(file_path, output_file=None):
     print("Last few values:", ds.longitude.values[-5:])
     
     # Check if longitude needs conversion
-    needs_conversion = ds.longitude.max() > 180
+    layout = GridLayout.from_dataset(ds, ascending_latitude=False)
+    needs_conversion = layout.wraps_longitude
     if needs_conversion:
         print("\nLongitude needs conversion from [0,360] to [-180,180]")
         
-        # Convert longitude values
-        ds_converted = ds.assign_coords(longitude=(((ds.longitude + 180) % 360) - 180))
-        ds_converted = ds_converted.sortby('longitude')
+        # Convert longitude values (lazy column reorder, no sortby copy)
+        ds_converted = layout.apply(ds)
         
         if output_file:
-            ds_converted.to_netcdf(output_file)
+            normalize_file(file_path, output_file, layout)
             print(f"Saved converted file to: {output_file}")
     else:
         ds_converted = ds
@@ -0,0 +1,510 @@
+"""
+Streaming writer for ERA5 forcing in the packed int16 layout used by the
+ESMF mesh (CDO style: u10, v10, msl on time x latitude x longitude).
+
+The full time x lat x lon cube is never held in memory. A first pass over
+time blocks collects the global min/max of each variable for the packing
+parameters, then a second pass packs every block and writes it straight into
+the preallocated output variable, so peak memory is set by the block size
+and not by the record length.
+
+With workers > 1 the per-(variable, time block) reads, min/max scans and
+packing run on a thread pool (NumPy and the netCDF/HDF5 C library release
+the GIL). libhdf5 is not thread-safe, so every netCDF call, including the
+input decompression and the compressed writes, is serialized on the same
+locks xarray takes for reads. Only the NumPy work overlaps; the printed
+wall time (file close included) against a workers=1 run shows whether
+that pays off on a given machine.
+
+append_esmf_forcing() extends an existing output file with the records
+that are newer than its last time step, reusing its packing parameters, so
+a daily update costs O(new data) instead of rewriting the whole record.
+
+Chunk shape, shuffle and deflate level of the output come from a named
+profile in OUTPUT_PROFILES; benchmark_profiles() writes the same data with
+each profile and reports write time, file size and per-timestep read latency.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from netCDF4 import Dataset
+from xarray.backends.locks import HDF5_LOCK, NETCDFC_LOCK, combine_locks
+
+FILL_VALUE = -32767
+# Packed values must stay clear of the fill value
+PACKED_MIN = -32766
+PACKED_MAX = 32767
+
+# Same combined lock (and acquisition order) xarray's netCDF4 backend uses for reads
+NETCDF_LOCK = combine_locks([NETCDFC_LOCK, HDF5_LOCK])
+
+ERA5_VARIABLES = {
+    'u10': ('10 metre U wind component', 'm s**-1'),
+    'v10': ('10 metre V wind component', 'm s**-1'),
+    'msl': ('Mean sea level pressure', 'Pa')
+}
+
+
+# Output layout profiles. chunk_time is the number of records per chunk
+# (chunks always span the full latitude x longitude field; None keeps the
+# netCDF library default). 'variables' holds per-variable overrides.
+OUTPUT_PROFILES = {
+    'default': {'zlib': True, 'complevel': 1, 'shuffle': False, 'chunk_time': None},
+    # No deflate, large chunks: cheapest to produce
+    'fast-write': {'zlib': False, 'complevel': 0, 'shuffle': False, 'chunk_time': 24},
+    # One 2D field per chunk, matching how ESMF/SCHISM read one time step at a time
+    'fast-read-per-timestep': {'zlib': True, 'complevel': 1, 'shuffle': True, 'chunk_time': 1},
+    # Multi-record chunks with shuffle and strong deflate
+    'smallest': {'zlib': True, 'complevel': 9, 'shuffle': True, 'chunk_time': 24,
+                 'variables': {'msl': {'chunk_time': 48}}},
+}
+
+
+def variable_encoding(profile, var_name, n_lat, n_lon):
+    """
+    netCDF4 createVariable keyword arguments for var_name under a profile.
+    """
+    if isinstance(profile, str):
+        if profile not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile '{profile}', "
+                             f"choose from {', '.join(OUTPUT_PROFILES)}")
+        profile = OUTPUT_PROFILES[profile]
+
+    settings = {key: value for key, value in profile.items() if key != 'variables'}
+    settings.update(profile.get('variables', {}).get(var_name, {}))
+
+    kwargs = {'zlib': settings.get('zlib', True),
+              'complevel': settings.get('complevel', 1),
+              'shuffle': settings.get('shuffle', False)}
+    if settings.get('chunk_time'):
+        kwargs['chunksizes'] = (settings['chunk_time'], n_lat, n_lon)
+    return kwargs
+
+
+def time_blocks(n_times, block_size):
+    """
+    Yield (start, stop) index pairs covering range(n_times) in blocks.
+    """
+    if block_size is None or block_size <= 0:
+        block_size = max(n_times, 1)
+    for start in range(0, n_times, block_size):
+        yield start, min(start + block_size, n_times)
+
+
+def read_block(data_array, time_dim, start, stop, layout=None):
+    """
+    Load time records start:stop of a lazily loaded variable, reordered and
+    subset to the output grid by layout (an era5_grid.GridLayout) if given.
+    """
+    if layout is not None:
+        return layout.read(data_array, time_dim, start, stop)
+    return data_array.isel({time_dim: slice(start, stop)}).values
+
+
+def block_min_max(data_array, time_dim, start, stop, layout=None):
+    """
+    nanmin/nanmax of one time block, (inf, -inf) if the block is all NaN.
+    """
+    block = read_block(data_array, time_dim, start, stop, layout)
+    if np.isnan(block).all():
+        return np.inf, -np.inf
+    return float(np.nanmin(block)), float(np.nanmax(block))
+
+
+def combine_min_max(name, ranges):
+    """
+    Reduce per-block (min, max) pairs to the global range of a variable.
+    """
+    data_min = min(r[0] for r in ranges)
+    data_max = max(r[1] for r in ranges)
+    if not np.isfinite(data_min):
+        raise ValueError(f"Variable {name} contains no valid data")
+    return data_min, data_max
+
+
+def scan_min_max(data_array, time_dim, block_size, layout=None):
+    """
+    Global nanmin/nanmax of a lazily loaded variable, read one time block at a time.
+    """
+    ranges = [block_min_max(data_array, time_dim, start, stop, layout)
+              for start, stop in time_blocks(data_array.sizes[time_dim], block_size)]
+    return combine_min_max(data_array.name, ranges)
+
+
+def packing_parameters(data_min, data_max):
+    """
+    scale_factor and add_offset mapping [data_min, data_max] onto int16,
+    leaving room for the fill value.
+    """
+    scale_factor = (data_max - data_min) / 65534
+    if scale_factor == 0:
+        scale_factor = 1.0
+    add_offset = (data_max + data_min) / 2
+    return scale_factor, add_offset
+
+
+def packed_range(scale_factor, add_offset):
+    """
+    Range of physical values representable with the given packing parameters.
+    """
+    return add_offset + PACKED_MIN * scale_factor, add_offset + PACKED_MAX * scale_factor
+
+
+def pack_block(data, scale_factor, add_offset):
+    """
+    Convert a float block to scaled short, NaN mapped to the fill value.
+
+    Values outside the representable range are clamped to it; in particular
+    the global minimum would otherwise land exactly on the fill value.
+    """
+    with np.errstate(invalid='ignore'):
+        scaled_data = np.clip((data - add_offset) / scale_factor, PACKED_MIN, PACKED_MAX)
+        scaled_data = scaled_data.astype(np.short)
+    scaled_data[np.isnan(data)] = FILL_VALUE
+    return scaled_data
+
+
+def create_forcing_file(output_file, time_hours, longitude, latitude, variables=ERA5_VARIABLES,
+                        profile='default'):
+    """
+    Create the output file with coordinates filled and empty packed variables.
+
+    Chunking and compression of the data variables follow the named (or dict)
+    output profile, see OUTPUT_PROFILES.
+
+    The file is returned open in write mode; the caller fills the data
+    variables block by block and closes it.
+    """
+    nc = Dataset(output_file, 'w', format='NETCDF4_CLASSIC')
+
+    nc.createDimension('time', None)
+    nc.createDimension('longitude', len(longitude))
+    nc.createDimension('latitude', len(latitude))
+
+    time_var = nc.createVariable('time', 'i4', ('time',), zlib=True, complevel=1)
+    time_var.standard_name = 'time'
+    time_var.long_name = 'time'
+    time_var.units = 'hours since 1900-01-01 00:00:00.0'
+    time_var.calendar = 'standard'
+    time_var.axis = 'T'
+    time_var[:] = np.asarray(time_hours, dtype=np.int32)
+
+    lon = nc.createVariable('longitude', 'f4', ('longitude',), zlib=True, complevel=1)
+    lon.standard_name = 'longitude'
+    lon.long_name = 'longitude'
+    lon.units = 'degrees_east'
+    lon.axis = 'X'
+    lon[:] = np.asarray(longitude, dtype=np.float32)
+
+    lat = nc.createVariable('latitude', 'f4', ('latitude',), zlib=True, complevel=1)
+    lat.standard_name = 'latitude'
+    lat.long_name = 'latitude'
+    lat.units = 'degrees_north'
+    lat.axis = 'Y'
+    lat[:] = np.asarray(latitude, dtype=np.float32)
+
+    for var_name, (long_name, units) in variables.items():
+        var = nc.createVariable(var_name, 'i2', ('time', 'latitude', 'longitude'),
+                                fill_value=FILL_VALUE,
+                                **variable_encoding(profile, var_name, len(latitude), len(longitude)))
+        # Data is packed here, netCDF4 must not scale it a second time
+        var.set_auto_maskandscale(False)
+        var.long_name = long_name
+        var.units = units
+        var.missing_value = np.int16(FILL_VALUE)
+        if var_name == 'msl':
+            var.standard_name = 'air_pressure_at_mean_sea_level'
+
+    nc.CDI = 'Climate Data Interface version 1.9.10 (https://mpimet.mpg.de/cdi)'
+    nc.Conventions = 'CF-1.6'
+    nc.history = f'{datetime.now().strftime("%a %b %d %H:%M:%S %Y")}: ERA5 data processed to match specified format'
+    nc.CDO = 'Climate Data Operators version 1.9.10 (https://mpimet.mpg.de/cdo)'
+
+    return nc
+
+
+def read_and_pack(data_array, time_dim, start, stop, scale_factor, add_offset, layout=None):
+    """
+    Worker task: read one time block and pack it.
+    """
+    block = read_block(data_array, time_dim, start, stop, layout)
+    return pack_block(block, scale_factor, add_offset)
+
+
+def write_esmf_forcing(ds, time_hours, output_file, block_size=24, time_dim='valid_time',
+                       variables=ERA5_VARIABLES, workers=1, profile='default', layout=None):
+    """
+    Pack ERA5 variables to int16 and write them to output_file one time block at a time.
+
+    Parameters:
+    -----------
+    ds : xarray.Dataset
+        Lazily opened ERA5 dataset
+    time_hours : array-like
+        Output time axis in hours since 1900-01-01
+    output_file : str
+        Name of the output netCDF file
+    block_size : int or None
+        Number of time records read and packed at once (None for the whole record)
+    time_dim : str
+        Name of the time dimension in ds
+    variables : dict
+        Mapping of variable name to (long_name, units)
+    workers : int
+        Number of threads reading and packing blocks; 1 runs serially
+    profile : str or dict
+        Output chunking/compression profile, see OUTPUT_PROFILES
+    layout : era5_grid.GridLayout or None
+        Subset/reordering applied to each block as it is read; None writes
+        ds in its stored order
+    """
+    n_times = ds.sizes[time_dim]
+    if len(time_hours) != n_times:
+        raise ValueError(f"time axis has {len(time_hours)} records, data has {n_times}")
+
+    t0 = time.perf_counter()
+    longitude, latitude = output_grid(ds, layout)
+    nc = create_forcing_file(output_file, time_hours, longitude, latitude, variables, profile)
+    try:
+        if workers is not None and workers > 1:
+            _write_parallel(ds, nc, n_times, block_size, time_dim, variables, workers, layout)
+        else:
+            workers = 1
+            _write_serial(ds, nc, n_times, block_size, time_dim, variables, layout)
+    finally:
+        nc.close()
+    # Measured after close, which flushes the deferred compressed chunks
+    print(f"Wrote {len(variables)} variables x {n_times} records in "
+          f"{time.perf_counter() - t0:.2f} s ({workers} thread(s))")
+
+
+def _set_packing(var, data_min, data_max):
+    scale_factor, add_offset = packing_parameters(data_min, data_max)
+    var.scale_factor = scale_factor
+    var.add_offset = add_offset
+    return scale_factor, add_offset
+
+
+def output_grid(ds, layout=None):
+    """
+    Output (longitude, latitude) axes of ds under an optional layout.
+    """
+    if layout is not None:
+        return layout.longitude, layout.latitude
+    return ds.longitude.values, ds.latitude.values
+
+
+def _write_serial(ds, nc, n_times, block_size, time_dim, variables, layout):
+    # Pass 1: global range for the packing parameters. All attributes are set
+    # before any data is written so the file header is defined only once.
+    packing = {}
+    for var_name in variables:
+        data_min, data_max = scan_min_max(ds[var_name], time_dim, block_size, layout)
+        packing[var_name] = _set_packing(nc.variables[var_name], data_min, data_max)
+
+    # Pass 2: pack and write each block
+    for var_name in variables:
+        print(f"Processing variable: {var_name}")
+        data_array = ds[var_name]
+        scale_factor, add_offset = packing[var_name]
+        var = nc.variables[var_name]
+        for start, stop in time_blocks(n_times, block_size):
+            block = read_block(data_array, time_dim, start, stop, layout)
+            var[start:stop, :, :] = pack_block(block, scale_factor, add_offset)
+
+
+def _write_parallel(ds, nc, n_times, block_size, time_dim, variables, workers, layout):
+    blocks = list(time_blocks(n_times, block_size))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Pass 1: min/max of every (variable, block) at once
+        print(f"Scanning {len(variables)} variables x {len(blocks)} blocks on {workers} threads")
+        futures = {var_name: [pool.submit(block_min_max, ds[var_name], time_dim, start, stop, layout)
+                              for start, stop in blocks]
+                   for var_name in variables}
+        packing = {}
+        for var_name, var_futures in futures.items():
+            data_min, data_max = combine_min_max(var_name, [f.result() for f in var_futures])
+            with NETCDF_LOCK:
+                packing[var_name] = _set_packing(nc.variables[var_name], data_min, data_max)
+
+        # Pass 2: read/pack on the pool, write from this thread in submission order.
+        # At most 2 * workers packed blocks are held in memory at a time.
+        pending = deque()
+
+        def write_oldest():
+            var_name, start, stop, future = pending.popleft()
+            packed = future.result()
+            with NETCDF_LOCK:
+                nc.variables[var_name][start:stop, :, :] = packed
+
+        for var_name in variables:
+            print(f"Processing variable: {var_name}")
+            scale_factor, add_offset = packing[var_name]
+            for start, stop in blocks:
+                future = pool.submit(read_and_pack, ds[var_name], time_dim, start, stop,
+                                     scale_factor, add_offset, layout)
+                pending.append((var_name, start, stop, future))
+                if len(pending) >= 2 * workers:
+                    write_oldest()
+        while pending:
+            write_oldest()
+
+
+
+def append_esmf_forcing(ds, time_hours, output_file, block_size=24, time_dim='valid_time',
+                        variables=ERA5_VARIABLES, on_overflow='error', layout=None):
+    """
+    Append the records of ds newer than the last time in output_file.
+
+    The existing file must have the same grid, variables and int16 packing.
+    New data is packed with the file's existing scale_factor/add_offset; if
+    it falls outside the representable range, on_overflow='error' raises
+    (the file then needs a full repack) and on_overflow='clamp' clamps it.
+
+    Returns:
+    --------
+    int
+        Number of appended time records
+    """
+    if on_overflow not in ('error', 'clamp'):
+        raise ValueError("on_overflow must be 'error' or 'clamp'")
+
+    time_hours = np.asarray(time_hours, dtype=np.int32)
+    if len(time_hours) != ds.sizes[time_dim]:
+        raise ValueError(f"time axis has {len(time_hours)} records, data has {ds.sizes[time_dim]}")
+
+    with Dataset(output_file, 'a') as nc:
+        _check_append_target(nc, output_grid(ds, layout), output_file, variables)
+
+        n_old = len(nc.dimensions['time'])
+        last_time = int(nc.variables['time'][-1]) if n_old else None
+        new_idx = np.arange(len(time_hours)) if last_time is None else np.flatnonzero(time_hours > last_time)
+        if len(new_idx) == 0:
+            print(f"No records newer than the last time in {output_file}, nothing to append")
+            return 0
+        first = int(new_idx[0])
+        if not np.array_equal(new_idx, np.arange(first, len(time_hours))):
+            raise ValueError("New records are not a contiguous tail of the input time axis")
+        n_new = len(time_hours) - first
+        new_ds = ds.isel({time_dim: slice(first, None)})
+
+        # Check the new data fits the existing packing before touching the file
+        packing = {}
+        for var_name in variables:
+            var = nc.variables[var_name]
+            var.set_auto_maskandscale(False)
+            scale_factor = float(var.scale_factor)
+            add_offset = float(var.add_offset)
+            data_min, data_max = scan_min_max(new_ds[var_name], time_dim, block_size, layout)
+            low, high = packed_range(scale_factor, add_offset)
+            if data_min < low or data_max > high:
+                message = (f"{var_name} range [{data_min:.6g}, {data_max:.6g}] exceeds the packed "
+                           f"range [{low:.6g}, {high:.6g}] of {output_file}")
+                if on_overflow == 'error':
+                    raise ValueError(message + "; repack the file or append with on_overflow='clamp'")
+                print(f"Warning: {message}, clamping")
+            packing[var_name] = (scale_factor, add_offset)
+
+        nc.variables['time'][n_old:n_old + n_new] = time_hours[first:]
+        for var_name in variables:
+            print(f"Appending variable: {var_name}")
+            scale_factor, add_offset = packing[var_name]
+            var = nc.variables[var_name]
+            for start, stop in time_blocks(n_new, block_size):
+                block = read_block(new_ds[var_name], time_dim, start, stop, layout)
+                var[n_old + start:n_old + stop, :, :] = pack_block(block, scale_factor, add_offset)
+
+        nc.history = (f'{datetime.now().strftime("%a %b %d %H:%M:%S %Y")}: appended '
+                      f'{n_new} ERA5 records\n' + getattr(nc, 'history', ''))
+
+    print(f"Appended {n_new} records to {output_file} ({n_old + n_new} total)")
+    return n_new
+
+
+def _check_append_target(nc, grid, output_file, variables):
+    for name, values in zip(('longitude', 'latitude'), grid):
+        existing = nc.variables[name][:]
+        incoming = np.asarray(values, dtype=np.float32)
+        if existing.shape != incoming.shape or not np.allclose(existing, incoming):
+            raise ValueError(f"{name} of the input does not match {output_file}")
+
+    if nc.variables['time'].units != 'hours since 1900-01-01 00:00:00.0':
+        raise ValueError(f"Unexpected time units in {output_file}: {nc.variables['time'].units}")
+
+    for var_name in variables:
+        if var_name not in nc.variables:
+            raise ValueError(f"{var_name} is missing from {output_file}")
+        var = nc.variables[var_name]
+        if var.dtype != np.int16 or not hasattr(var, 'scale_factor') or not hasattr(var, 'add_offset'):
+            raise ValueError(f"{var_name} in {output_file} is not packed int16")
+        if int(var._FillValue) != FILL_VALUE:
+            raise ValueError(f"{var_name} in {output_file} has fill value {var._FillValue}")
+
+
+def read_latency(output_file, variables=ERA5_VARIABLES, n_samples=24):
+    """
+    Mean and max wall time (ms) to read one full 2D field, sampled evenly over time.
+    """
+    latencies = []
+    with Dataset(output_file, 'r') as nc:
+        n_times = len(nc.dimensions['time'])
+        steps = np.unique(np.linspace(0, n_times - 1, min(n_samples, n_times)).astype(int))
+        for var_name in variables:
+            var = nc.variables[var_name]
+            var.set_auto_maskandscale(False)
+            for t in steps:
+                t0 = time.perf_counter()
+                var[t, :, :]
+                latencies.append((time.perf_counter() - t0) * 1000)
+    return float(np.mean(latencies)), float(np.max(latencies))
+
+
+def benchmark_profiles(ds, time_hours, workdir='.', profiles=None, block_size=24,
+                       time_dim='valid_time', variables=ERA5_VARIABLES, n_read_samples=24,
+                       keep_files=False, layout=None):
+    """
+    Write the same ERA5 data once per output profile and compare the layouts.
+
+    Reports write time, file size and per-timestep read latency measured on
+    the written file. Reads right after writing are usually served from the
+    OS page cache, so the latency mostly reflects decompression and chunk
+    layout, not disk speed.
+
+    Returns:
+    --------
+    list of dict
+        One row per profile with keys profile, write_s, size_mb, read_mean_ms, read_max_ms
+    """
+    if profiles is None:
+        profiles = list(OUTPUT_PROFILES)
+
+    results = []
+    for name in profiles:
+        output_file = os.path.join(workdir, f"benchmark_{name}.nc")
+        print(f"Benchmarking profile '{name}'")
+        t0 = time.perf_counter()
+        write_esmf_forcing(ds, time_hours, output_file, block_size=block_size,
+                           time_dim=time_dim, variables=variables, profile=name, layout=layout)
+        write_s = time.perf_counter() - t0
+        read_mean, read_max = read_latency(output_file, variables, n_read_samples)
+        results.append({
+            'profile': name,
+            'write_s': write_s,
+            'size_mb': os.path.getsize(output_file) / 1024**2,
+            'read_mean_ms': read_mean,
+            'read_max_ms': read_max
+        })
+        if not keep_files:
+            os.remove(output_file)
+
+    print(f"\n{'profile':<24}{'write (s)':>10}{'size (MB)':>11}{'read mean (ms)':>16}{'read max (ms)':>15}")
+    for row in results:
+        print(f"{row['profile']:<24}{row['write_s']:>10.2f}{row['size_mb']:>11.2f}"
+              f"{row['read_mean_ms']:>16.2f}{row['read_max_ms']:>15.2f}")
+    return results
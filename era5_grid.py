@@ -0,0 +1,353 @@
+"""
+Spatial helpers for regular ERA5 latitude/longitude grids.
+
+Mesh extent: the node bounding box of a SCHISM hgrid.gr3 is read once and
+cached next to the mesh (hgrid.gr3.bbox.json, keyed by file size and mtime).
+
+Subsetting: a (lon_min, lat_min, lon_max, lat_max) window plus a halo is
+turned into index ranges on the ERA5 axes, handling 0-360 vs -180-180
+longitudes (including windows across the seam) and descending latitudes,
+so only the needed window is read from disk.
+
+Normalization: GridLayout detects once how a grid differs from ascending
+latitude / [-180, 180) longitude order and expresses the fix as a few
+contiguous longitude runs (the split-and-roll of a 0-360 axis) plus a
+reversed latitude view. Blocks are read run by run straight into the output
+buffer, so no argsort/reindex copy of the variables is ever made.
+"""
+
+import json
+import os
+
+import numpy as np
+from netCDF4 import Dataset
+
+
+def as_bbox(bbox):
+    """
+    Normalize a bbox to a (lon_min, lat_min, lon_max, lat_max) tuple.
+
+    Accepts a 4-sequence or an object with xmin/ymin/xmax/ymax attributes,
+    such as the one returned by pyschism's Hgrid.get_bbox().
+    """
+    if hasattr(bbox, 'xmin'):
+        return float(bbox.xmin), float(bbox.ymin), float(bbox.xmax), float(bbox.ymax)
+    lon_min, lat_min, lon_max, lat_max = (float(v) for v in bbox)
+    return lon_min, lat_min, lon_max, lat_max
+
+
+def read_mesh_bbox(hgrid_path, use_cache=True):
+    """
+    Node bounding box (lon_min, lat_min, lon_max, lat_max) of a gr3 mesh.
+
+    Only the node table is parsed (element connectivity is skipped). The
+    result is cached in <hgrid_path>.bbox.json and reused while the mesh
+    file's size and mtime are unchanged.
+    """
+    stat = os.stat(hgrid_path)
+    key = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    cache_path = hgrid_path + '.bbox.json'
+
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached.get('key') == key:
+            return tuple(cached['bbox'])
+
+    with open(hgrid_path) as f:
+        f.readline()  # mesh name
+        _, n_nodes = map(int, f.readline().split()[:2])
+        nodes = np.loadtxt(f, usecols=(1, 2), max_rows=n_nodes)
+
+    bbox = (float(nodes[:, 0].min()), float(nodes[:, 1].min()),
+            float(nodes[:, 0].max()), float(nodes[:, 1].max()))
+
+    if use_cache:
+        try:
+            with open(cache_path, 'w') as f:
+                json.dump({'key': key, 'bbox': bbox}, f)
+        except OSError:
+            pass  # read-only mesh directory, just skip the cache
+    return bbox
+
+
+def _axis_range(coord, low, high):
+    """
+    Index range [start, stop) of an ascending axis covering [low, high],
+    extended by one point on each side so the window encloses the bounds.
+    """
+    start = max(int(np.searchsorted(coord, low, side='right')) - 1, 0)
+    stop = min(int(np.searchsorted(coord, high, side='left')) + 1, len(coord))
+    return start, stop
+
+
+def longitude_segments(longitude, lon_min, lon_max):
+    """
+    Index slices of an ascending longitude axis covering [lon_min, lon_max].
+
+    The bounds may be given in either convention. On a 0-360 axis a window
+    crossing 0 (or on a -180-180 axis a window crossing 180) returns two
+    slices, [east part, west part], to be read in that order.
+    """
+    longitude = np.asarray(longitude)
+    n_lon = len(longitude)
+    if lon_max - lon_min >= 360:
+        return [slice(0, n_lon)]
+
+    if longitude.max() > 180:
+        lon_min, lon_max = lon_min % 360, lon_max % 360
+    else:
+        lon_min, lon_max = ((lon_min + 180) % 360) - 180, ((lon_max + 180) % 360) - 180
+
+    if lon_min <= lon_max:
+        start, stop = _axis_range(longitude, lon_min, lon_max)
+        return [slice(start, stop)]
+
+    # Window crosses the seam of the axis
+    east_start, _ = _axis_range(longitude, lon_min, longitude[-1])
+    _, west_stop = _axis_range(longitude, longitude[0], lon_max)
+    return [slice(east_start, n_lon), slice(0, west_stop)]
+
+
+def latitude_slice(latitude, lat_min, lat_max):
+    """
+    Index slice, in file order, of a latitude axis covering [lat_min, lat_max].
+
+    Works for ascending and descending (ERA5 default) axes.
+    """
+    latitude = np.asarray(latitude)
+    n_lat = len(latitude)
+    if latitude[0] > latitude[-1]:
+        start, stop = _axis_range(latitude[::-1], lat_min, lat_max)
+        return slice(n_lat - stop, n_lat - start)
+    start, stop = _axis_range(latitude, lat_min, lat_max)
+    return slice(start, stop)
+
+
+def subset_indexers(longitude, latitude, bbox, halo=0.5):
+    """
+    isel indexers selecting bbox (plus halo in degrees) from an ERA5 grid.
+
+    Returns a dict with 'longitude' and 'latitude' entries. They are slices,
+    except when the window crosses the longitude seam, where 'longitude' is
+    an integer index array (east part followed by west part).
+    """
+    lon_min, lat_min, lon_max, lat_max = as_bbox(bbox)
+    lon_segments = longitude_segments(longitude, lon_min - halo, lon_max + halo)
+    lat_index = latitude_slice(latitude, max(lat_min - halo, -90.0), min(lat_max + halo, 90.0))
+
+    if len(lon_segments) == 1:
+        lon_index = lon_segments[0]
+    else:
+        lon_index = np.concatenate([np.arange(s.start, s.stop) for s in lon_segments])
+    return {'longitude': lon_index, 'latitude': lat_index}
+
+
+def contiguous_runs(index):
+    """
+    Split an integer index array into (out_start, out_stop, source_slice) runs
+    of consecutive source indices.
+    """
+    index = np.asarray(index)
+    breaks = np.flatnonzero(np.diff(index) != 1) + 1
+    bounds = np.concatenate([[0], breaks, [len(index)]])
+    return [(int(a), int(b), slice(int(index[a]), int(index[b - 1]) + 1))
+            for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+class GridLayout:
+    """
+    Read plan mapping a file's latitude/longitude axes to the output grid.
+
+    Parameters:
+    -----------
+    longitude, latitude : array-like
+        Coordinate axes as stored in the file
+    bbox : tuple or None
+        Optional (lon_min, lat_min, lon_max, lat_max) window, see subset_indexers
+    halo : float
+        Margin in degrees added around bbox
+    wrap_longitude : bool
+        Convert 0-360 longitudes to [-180, 180) and roll the columns to match.
+        Without it the file's convention is kept, except for a bbox window
+        across the axis seam: its two segments are labelled in the other
+        convention (-180-180 for a 0-360 axis, 0-360 for a -180-180 one) so
+        the output axis stays monotonic
+    ascending_latitude : bool
+        Reverse descending latitudes
+    """
+
+    def __init__(self, longitude, latitude, bbox=None, halo=0.5,
+                 wrap_longitude=True, ascending_latitude=True):
+        longitude = np.asarray(longitude)
+        latitude = np.asarray(latitude)
+
+        if bbox is not None:
+            indexers = subset_indexers(longitude, latitude, bbox, halo)
+            lon_index = np.arange(len(longitude))[indexers['longitude']]
+            self.lat_slice = indexers['latitude']
+        else:
+            lon_index = np.arange(len(longitude))
+            self.lat_slice = slice(0, len(latitude))
+
+        lon_values = longitude[lon_index]
+        self.wraps_longitude = bool(wrap_longitude and longitude.max() > 180)
+        if self.wraps_longitude:
+            lon_values = ((lon_values + 180) % 360) - 180
+        if wrap_longitude:
+            # Ordering the 1-D axis is cheap; the data only follows via the runs below
+            order = np.argsort(lon_values, kind='stable')
+            lon_index = lon_index[order]
+            lon_values = lon_values[order]
+        self.relabels_seam = bool(np.any(np.diff(lon_values) < 0))
+        if self.relabels_seam:
+            # Window across the seam read in file convention: east segment then west
+            # segment, e.g. 354.5 ... 359.75, 0 ... 5.5 becomes -5.5 ... 5.5
+            if longitude.max() > 180:
+                lon_values = ((lon_values + 180) % 360) - 180
+            else:
+                lon_values = lon_values % 360
+            if np.any(np.diff(lon_values) <= 0):
+                raise ValueError("Longitude window cannot be ordered monotonically")
+
+        lat_values = latitude[self.lat_slice]
+        self.flips_latitude = bool(ascending_latitude and len(lat_values) > 1
+                                   and lat_values[0] > lat_values[-1])
+        if self.flips_latitude:
+            lat_values = lat_values[::-1]
+
+        self.lon_index = lon_index
+        self.lon_runs = contiguous_runs(lon_index)
+        self.longitude = lon_values
+        self.latitude = lat_values
+
+    @classmethod
+    def from_dataset(cls, ds, **kwargs):
+        return cls(ds['longitude'][:], ds['latitude'][:], **kwargs)
+
+    @property
+    def shape(self):
+        return len(self.latitude), len(self.longitude)
+
+    @property
+    def is_identity(self):
+        return (len(self.lon_runs) == 1 and not self.flips_latitude
+                and not self.wraps_longitude)
+
+    def describe(self):
+        parts = [f"{self.shape[0]}x{self.shape[1]} grid"]
+        if self.wraps_longitude:
+            parts.append(f"longitude 0-360 -> -180-180 in {len(self.lon_runs)} runs")
+        elif self.relabels_seam:
+            parts.append(f"window across the longitude seam relabelled to "
+                         f"{self.longitude[0]:g} to {self.longitude[-1]:g}")
+        if self.flips_latitude:
+            parts.append("latitude reversed")
+        return ', '.join(parts)
+
+    def _assemble(self, read_run):
+        pieces = [(a, b, read_run(run)) for a, b, run in self.lon_runs]
+        if len(pieces) == 1:
+            block = pieces[0][2]
+        else:
+            first = pieces[0][2]
+            block = np.empty(first.shape[:-1] + (len(self.longitude),), dtype=first.dtype)
+            for a, b, piece in pieces:
+                block[..., a:b] = piece
+        if self.flips_latitude:
+            block = block[..., ::-1, :]
+        return block
+
+    def read(self, data_array, time_dim=None, start=None, stop=None):
+        """
+        Read an xarray variable (optionally time records start:stop) in output order.
+        """
+        indexers = {'latitude': self.lat_slice}
+        if time_dim is not None:
+            indexers[time_dim] = slice(start, stop)
+
+        def read_run(run):
+            return data_array.isel({**indexers, 'longitude': run}).values
+
+        return self._assemble(read_run)
+
+    def read_nc(self, var, start=None, stop=None):
+        """
+        Read a netCDF4 variable with (..., latitude, longitude) dimensions in
+        output order; start:stop indexes the first dimension (e.g. time) of
+        variables with more than two dimensions, such as (time, level,
+        latitude, longitude).
+        """
+        index = [slice(None)] * var.ndim
+        if var.ndim > 2:
+            index[0] = slice(start, stop)
+        index[var.dimensions.index('latitude')] = self.lat_slice
+        lon_axis = var.dimensions.index('longitude')
+
+        def read_run(run):
+            index[lon_axis] = run
+            return var[tuple(index)]
+
+        return self._assemble(read_run)
+
+    def apply(self, ds):
+        """
+        Lazily reorder/subset an xarray dataset to the output grid; no data is read.
+        """
+        lat_index = np.arange(self.lat_slice.start, self.lat_slice.stop)
+        if self.flips_latitude:
+            lat_index = lat_index[::-1]
+        lon_index = self.lon_runs[0][2] if len(self.lon_runs) == 1 else self.lon_index
+        out = ds.isel(longitude=lon_index, latitude=lat_index)
+        return out.assign_coords(longitude=('longitude', self.longitude, ds.longitude.attrs))
+
+
+def normalize_file(input_file, output_file, layout=None, block_size=24):
+    """
+    Write input_file reordered by layout (default: wrap longitudes, ascending
+    latitudes), streaming each (time, ..., latitude, longitude) variable one
+    block of time records at a time.
+
+    Variable data is copied raw (packed values and attributes unchanged).
+    """
+    with Dataset(input_file, 'r') as src, Dataset(output_file, 'w', format=src.data_model) as dst:
+        src.set_auto_maskandscale(False)
+        if layout is None:
+            layout = GridLayout(src['longitude'][:], src['latitude'][:])
+        print(f"Normalizing {input_file}: {layout.describe()}")
+
+        dst.setncatts({name: src.getncattr(name) for name in src.ncattrs()})
+        new_sizes = {'latitude': len(layout.latitude), 'longitude': len(layout.longitude)}
+        for name, dim in src.dimensions.items():
+            size = None if dim.isunlimited() else new_sizes.get(name, len(dim))
+            dst.createDimension(name, size)
+
+        for name, var in src.variables.items():
+            attrs = {a: var.getncattr(a) for a in var.ncattrs() if a != '_FillValue'}
+            fill_value = var.getncattr('_FillValue') if '_FillValue' in var.ncattrs() else None
+            filters = var.filters() or {}
+            out = dst.createVariable(name, var.dtype, var.dimensions, fill_value=fill_value,
+                                     zlib=filters.get('zlib', False),
+                                     complevel=filters.get('complevel', 4),
+                                     shuffle=filters.get('shuffle', False))
+            out.set_auto_maskandscale(False)
+            out.setncatts(attrs)
+
+            if name == 'longitude':
+                out[:] = layout.longitude.astype(var.dtype)
+            elif name == 'latitude':
+                out[:] = layout.latitude.astype(var.dtype)
+            elif var.dimensions[-2:] == ('latitude', 'longitude'):
+                if var.ndim == 2:
+                    out[...] = layout.read_nc(var)
+                else:
+                    # Blocks along the leading (time) dimension, any dimensions in between
+                    n_times = var.shape[0]
+                    step = block_size or n_times
+                    for start in range(0, n_times, step):
+                        stop = min(start + step, n_times)
+                        out[start:stop, ...] = layout.read_nc(var, start, stop)
+            else:
+                out[:] = var[:]
+    print(f"Saved normalized file to: {output_file}")
+    return layout
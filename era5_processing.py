@@ -0,0 +1,99 @@
+"""
+ERA5 to ESMF-mesh forcing conversion, shared by modify_era5_4_esmfmesh.py
+and ESMF_MESH_TOOLS/modify_era5_4_esmfmesh2.py.
+
+The scripts differ only in the output grid order: the first wraps
+longitudes to [-180, 180) and flips latitudes to ascending order, the second
+keeps the file order. Both are GridLayout options passed through here.
+"""
+
+import os
+
+import xarray as xr
+
+from era5_esmf import write_esmf_forcing, append_esmf_forcing, benchmark_profiles
+from era5_grid import GridLayout, read_mesh_bbox
+from time_encoding import datetime64_to_hours_since_1900
+
+
+def open_era5(input_file, hgrid=None, bbox=None, halo=0.5, wrap_longitude=True,
+              ascending_latitude=True):
+    """
+    Open ERA5 lazily and return it with the time axis in hours since
+    1900-01-01 and the GridLayout mapping it to the output grid.
+
+    If hgrid (path to hgrid.gr3) or bbox (lon_min, lat_min, lon_max, lat_max)
+    is given, only that window plus halo degrees is kept, so just the part of
+    the grid covering the mesh is ever read. wrap_longitude and
+    ascending_latitude select the output grid order (see GridLayout).
+    """
+    # Open the file (data stays on disk until each block is read)
+    ds = xr.open_dataset(input_file)
+
+    if hgrid is not None and bbox is None:
+        bbox = read_mesh_bbox(hgrid)
+
+    # Mesh window and grid order are applied per block while reading,
+    # without reordering copies of the data
+    layout = GridLayout.from_dataset(ds, bbox=bbox, halo=halo, wrap_longitude=wrap_longitude,
+                                     ascending_latitude=ascending_latitude)
+    print(f"Output grid: {layout.describe()}")
+
+    # Convert time to hours since 1900-01-01
+    time_hours = datetime64_to_hours_since_1900(ds.valid_time.values)
+    return ds, time_hours, layout
+
+
+def process_era5_data(input_file, output_file, block_size=24, workers=1, profile='default',
+                      append=False, on_overflow='error', hgrid=None, bbox=None, halo=0.5,
+                      wrap_longitude=True, ascending_latitude=True):
+    """
+    Process ERA5 data to match the specified NetCDF format
+
+    Data is read, packed and written in blocks of block_size time records
+    (None processes the whole record at once), so memory use does not grow
+    with the record length. workers > 1 reads and packs variables and time
+    blocks on a thread pool (e.g. workers=os.cpu_count()). profile selects
+    the output chunking/compression layout (see era5_esmf.OUTPUT_PROFILES).
+
+    With append=True and an existing output_file, only records newer than its
+    last time step are packed (with the file's scale_factor/add_offset) and
+    appended; on_overflow='error' reports data outside the packed range,
+    'clamp' clamps it.
+
+    hgrid/bbox/halo and the grid order flags are passed to open_era5.
+
+    Returns:
+    --------
+    str
+        output_file
+    """
+    ds, time_hours, layout = open_era5(input_file, hgrid=hgrid, bbox=bbox, halo=halo,
+                                       wrap_longitude=wrap_longitude,
+                                       ascending_latitude=ascending_latitude)
+    with ds:
+        if append and os.path.exists(output_file):
+            append_esmf_forcing(ds, time_hours, output_file, block_size=block_size,
+                                on_overflow=on_overflow, layout=layout)
+        else:
+            # Pack and write one time block at a time so the full cube never sits in memory
+            write_esmf_forcing(ds, time_hours, output_file, block_size=block_size,
+                               workers=workers, profile=profile, layout=layout)
+
+    print(f"Processed file saved as: {output_file}")
+    return output_file
+
+
+def benchmark_era5_profiles(input_file, workdir='.', profiles=None, block_size=24,
+                            hgrid=None, bbox=None, halo=0.5, wrap_longitude=True,
+                            ascending_latitude=True):
+    """
+    Write input_file with every output profile and print write time, file size
+    and per-timestep read latency for each, to pick a layout from numbers.
+    """
+    ds, time_hours, layout = open_era5(input_file, hgrid=hgrid, bbox=bbox, halo=halo,
+                                       wrap_longitude=wrap_longitude,
+                                       ascending_latitude=ascending_latitude)
+    with ds:
+        return benchmark_profiles(ds, time_hours, workdir=workdir, profiles=profiles,
+                                  block_size=block_size, layout=layout)
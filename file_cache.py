@@ -0,0 +1,63 @@
+"""
+Binary sidecar cache for arrays parsed from text files.
+
+Arrays derived from <file> are stored as .npy files in <file>.npcache/
+together with a meta.json recording the source file's size and mtime and a
+caller-supplied key (parser options). A cache is only used while all of
+these still match, and is loaded memory-mapped, so reopening a multi-year
+record costs a stat and a few mmaps instead of a text parse.
+"""
+
+import json
+import os
+
+import numpy as np
+
+
+def cache_dir(path):
+    return path + '.npcache'
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def load_arrays(path, key=None, mmap=True):
+    """
+    Cached arrays for path as {name: array}, or None if there is no cache
+    or it no longer matches the source file or key.
+    """
+    meta_path = os.path.join(cache_dir(path), 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('source') != _source_stamp(path) or meta.get('key') != key:
+            return None
+        mmap_mode = 'r' if mmap else None
+        return {name: np.load(os.path.join(cache_dir(path), name + '.npy'), mmap_mode=mmap_mode)
+                for name in meta['arrays']}
+    except (OSError, ValueError, KeyError):
+        return None  # partial or corrupt cache, parse again
+
+
+def save_arrays(path, arrays, key=None):
+    """
+    Store {name: array} for path. meta.json is written last, so an
+    interrupted save is never picked up as valid. Returns False if the
+    directory is not writable.
+    """
+    directory = cache_dir(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        for name, values in arrays.items():
+            np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(values))
+        meta_tmp = os.path.join(directory, 'meta.json.tmp')
+        with open(meta_tmp, 'w') as f:
+            json.dump({'source': _source_stamp(path), 'key': key, 'arrays': list(arrays)}, f)
+        os.replace(meta_tmp, os.path.join(directory, 'meta.json'))
+        return True
+    except OSError:
+        return False  # read-only data directory, just skip the cache
@@ -0,0 +1,243 @@
+"""
+Streaming netCDF writer for derived (time, latitude, longitude) forcing.
+
+The output file is laid out up front with its final encoding (float32
+fields with _FillValue -9999, int64 "seconds since 1970-01-01" time) and the
+fields are then written one time block at a time as each block is
+produced, so peak memory is one block per variable rather than copies of
+the whole cube. Latitude reversal is applied per block on the way out.
+
+Blocks are handed to a single writer thread, so computing the next block
+(reading, resampling, blending) overlaps with writing the previous one.
+libhdf5 is not thread-safe, so every write holds the same lock xarray
+takes for its netCDF reads.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from netCDF4 import Dataset
+
+from era5_esmf import NETCDF_LOCK
+
+FILL_VALUE = -9999.0
+TIME_ATTRS = {
+    'long_name': 'time',
+    'standard_name': 'time',
+    'units': 'seconds since 1970-01-01',
+    'calendar': 'proleptic_gregorian'
+}
+
+
+class ForcingWriter:
+    """
+    Output forcing file with preallocated (time, latitude, longitude) variables.
+
+    Parameters:
+    -----------
+    output_file : str
+        Output netCDF file (overwritten)
+    time_seconds : array-like
+        Output times in seconds since 1970-01-01, stored as int64
+    latitude, longitude : array-like
+        Grid axes in the order the blocks are produced
+    reverse_latitude : bool
+        Store latitude (and every block) in reverse order
+    time_dim : str
+        Name of the time dimension/variable in the file
+    lat_attrs, lon_attrs, global_attrs : dict
+        Attributes copied to the file
+    """
+
+    def __init__(self, output_file, time_seconds, latitude, longitude, reverse_latitude=False,
+                 time_dim='time', lat_attrs=None, lon_attrs=None, global_attrs=None,
+                 format='NETCDF4'):
+        self.output_file = output_file
+        self.time_dim = time_dim
+        self.reverse_latitude = reverse_latitude
+        latitude = np.asarray(latitude)
+        if reverse_latitude:
+            latitude = latitude[::-1]
+        self.grid_shape = (len(latitude), len(longitude))
+
+        self.nc = Dataset(output_file, 'w', format=format)
+        self.nc.createDimension(time_dim, len(time_seconds))
+        self.nc.createDimension('latitude', len(latitude))
+        self.nc.createDimension('longitude', len(longitude))
+
+        time_var = self.nc.createVariable(time_dim, 'i8', (time_dim,))
+        time_var.setncatts(TIME_ATTRS)
+        time_var[:] = np.asarray(time_seconds, dtype=np.int64)
+        for name, values, attrs in (('latitude', latitude, lat_attrs),
+                                    ('longitude', np.asarray(longitude), lon_attrs)):
+            var = self.nc.createVariable(name, values.dtype, (name,))
+            var.setncatts(_netcdf_attrs(attrs))
+            var[:] = values
+        self.nc.setncatts(_netcdf_attrs(global_attrs))
+
+    @classmethod
+    def from_dataset(cls, output_file, ds, time_dim='valid_time', out_time_dim='time',
+                     reverse_latitude=False, **kwargs):
+        """
+        Writer on the time axis and grid of an output skeleton dataset (time
+        in seconds since 1970-01-01). Variables of ds other than
+        (time, latitude, longitude) fields, e.g. ERA5's expver(valid_time),
+        are copied as they are.
+        """
+        writer = cls(output_file, ds[time_dim].values, ds.latitude.values, ds.longitude.values,
+                     reverse_latitude=reverse_latitude, time_dim=out_time_dim,
+                     lat_attrs=ds.latitude.attrs, lon_attrs=ds.longitude.attrs,
+                     global_attrs=ds.attrs, **kwargs)
+        for name, da in ds.data_vars.items():
+            if is_field(da, time_dim):
+                continue
+            dims = tuple(out_time_dim if dim == time_dim else dim for dim in da.dims)
+            for dim, size in zip(dims, da.shape):
+                if dim not in writer.nc.dimensions:
+                    writer.nc.createDimension(dim, size)
+            values = da.values
+            if values.dtype.kind in 'OSU':
+                # Labels such as expver; gaps from reindexing become ''
+                values = np.array(['' if v is None or v != v else str(v) for v in values.ravel()],
+                                  dtype=object).reshape(values.shape)
+                var = writer.nc.createVariable(name, str, dims)
+            else:
+                var = writer.nc.createVariable(name, values.dtype, dims)
+            var.setncatts(_netcdf_attrs(da.attrs))
+            if reverse_latitude and 'latitude' in dims:
+                values = np.flip(values, axis=dims.index('latitude'))
+            var[...] = values
+        return writer
+
+    def add_variable(self, name, attrs=None, dtype='float32', fill_value=FILL_VALUE, chunk_time=None):
+        """
+        Create a (time, latitude, longitude) output variable with its final encoding.
+        """
+        chunksizes = None if chunk_time is None else (chunk_time,) + self.grid_shape
+        var = self.nc.createVariable(name, dtype, (self.time_dim, 'latitude', 'longitude'),
+                                     fill_value=fill_value, chunksizes=chunksizes)
+        var.setncatts(_netcdf_attrs({k: v for k, v in (attrs or {}).items() if k != '_FillValue'}))
+        return var
+
+    def write(self, name, start, stop, values):
+        """
+        Write time records start:stop of name; NaN become the fill value.
+        """
+        var = self.nc[name]
+        values = np.asarray(values, dtype=var.dtype)
+        if self.reverse_latitude:
+            values = values[:, ::-1, :]
+        fill_value = getattr(var, '_FillValue', None)
+        if fill_value is not None and values.dtype.kind == 'f':
+            values = np.where(np.isnan(values), fill_value, values)
+        with NETCDF_LOCK:
+            var[start:stop] = values
+
+    def write_blocks(self, streams, overlap=True):
+        """
+        Drain block generators into the file.
+
+        streams maps variable name -> iterator of (start, stop, values)
+        blocks (e.g. TemporalResampler.blocks, StationBlender.blocks,
+        dataset_blocks). With overlap, each write runs on a writer thread
+        while the next block is computed; at most two writes are pending.
+        """
+        if not overlap:
+            for name, blocks in streams.items():
+                for start, stop, values in blocks:
+                    self.write(name, start, stop, values)
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = deque()
+            for name, blocks in streams.items():
+                for start, stop, values in blocks:
+                    pending.append(pool.submit(self.write, name, start, stop, values))
+                    if len(pending) > 2:
+                        pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+
+    def close(self):
+        self.nc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_field(data_array, time_dim):
+    """
+    Whether data_array is a (time, latitude, longitude) field written in blocks.
+    """
+    return data_array.dims == (time_dim, 'latitude', 'longitude')
+
+
+def dataset_blocks(data_array, time_dim, block_size=48):
+    """
+    Yield (start, stop, values) time slabs of a (time, lat, lon) DataArray;
+    broadcast views (wind_utils.uniform_field) stay views until written.
+    """
+    n_times = data_array.sizes[time_dim]
+    for start in range(0, n_times, block_size):
+        stop = min(start + block_size, n_times)
+        yield start, stop, data_array.isel({time_dim: slice(start, stop)}).values
+
+
+def write_forcing(output_file, ds, streamed=None, time_dim='valid_time', out_time_dim='time',
+                  reverse_latitude=False, block_size=48, fill_value=FILL_VALUE, overlap=True):
+    """
+    Write an output skeleton dataset plus streamed variables block by block.
+
+    Parameters:
+    -----------
+    output_file : str
+        Output netCDF file
+    ds : xarray.Dataset
+        Output time axis (seconds since 1970-01-01), grid and attributes;
+        its (time, latitude, longitude) variables are written in block_size
+        slabs, any others (e.g. expver) are copied whole
+    streamed : dict, optional
+        name -> {'attrs', 'blocks'} for variables produced block by block
+    time_dim, out_time_dim : str
+        Time dimension in ds and in the file
+    reverse_latitude : bool
+        Store latitudes (and every block) reversed
+    block_size : int
+        Time records per slab for the variables held in ds
+    fill_value : float
+        _FillValue of the float32 fields
+    overlap : bool
+        Write on a background thread while the next block is computed
+    """
+    streamed = streamed or {}
+    with ForcingWriter.from_dataset(output_file, ds, time_dim=time_dim, out_time_dim=out_time_dim,
+                                    reverse_latitude=reverse_latitude) as writer:
+        streams = {}
+        for name, da in ds.data_vars.items():
+            if is_field(da, time_dim):
+                writer.add_variable(name, da.attrs, fill_value=fill_value)
+                streams[name] = dataset_blocks(da, time_dim, block_size)
+        for name, spec in streamed.items():
+            writer.add_variable(name, spec.get('attrs'), fill_value=fill_value)
+            streams[name] = spec['blocks']
+
+        writer.write_blocks(streams, overlap=overlap)
+    print(f"Wrote {', '.join(streams)} in time blocks to {output_file}")
+
+
+def _netcdf_attrs(attrs):
+    """
+    Attributes netCDF can store (drops None values, stringifies the rest if needed).
+    """
+    out = {}
+    for key, value in (attrs or {}).items():
+        if value is None:
+            continue
+        if not isinstance(value, (str, int, float, np.number, np.ndarray, list, tuple)):
+            value = str(value)
+        out[key] = value
+    return out
@@ -1,14 +1,390 @@
-import xarray as xr
-import numpy as np
-from netCDF4 import Dataset
-import glob
+"""
+Merge PaHM structured-grid wind files (pahm_windout-*_STR{N}.nc) along time.
+
+The merge runs in two steps:
+  1. Only the time coordinate of every input is read, and a global plan is
+     built: the sorted output time axis without duplicates (the first file
+     listed wins a tie) and, for every output step, the source file and record.
+  2. The output file is created up front with its full time axis, and each
+     time-dependent variable is copied from the sources in slabs of at most
+     block_size records, one contiguous run at a time.
+
+Memory use is one slab per variable regardless of the number or length of
+the inputs, and no merged copy of the record is ever held in memory.
+
+Inputs are scanned by a process pool, and all of them are checked for a
+common grid before anything is copied. Each worker opens its files with
+its own copy of libhdf5 (which is not thread-safe, so threads would have
+to take turns), so the per-file metadata round trips of a parallel file
+system overlap instead of running one after another. A scan is a small
+dict of times and digests, cheap to send back.
+
+A manifest (<output>.manifest.json) records every merged input (size,
+mtime and times) and the source of every output record. On a rerun only new
+or changed inputs are scanned. If the existing output time axis is still a
+prefix of the new plan, only the records that are new or whose source
+changed are written: appended at the end or spliced in place. Anything
+else, e.g. an input that changes earlier times, leads to a full rewrite.
+"""
+
+import hashlib
+import json
 import os
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+
+import numpy as np
+from netCDF4 import Dataset, num2date, date2num
+
+from nc_stats import file_stats
+
+TIME_DIM = 'time'
+BLOCK_SIZE = 24
+SCAN_WORKERS = 16
+MANIFEST_VERSION = 1
+
+
+def scan_input(filename, time_dim=TIME_DIM):
+    """
+    Time coordinate and layout of one input file, without reading any field.
+    Variables without the time dimension (the grid) are summarized by a digest.
+    """
+    with Dataset(filename, 'r') as nc:
+        time = nc.variables[time_dim]
+        static = {}
+        for name, var in nc.variables.items():
+            if time_dim not in var.dimensions:
+                var.set_auto_maskandscale(False)
+                static[name] = hashlib.sha1(np.ascontiguousarray(var[...]).tobytes()).hexdigest()
+        return {
+            'file': filename,
+            'times': np.asarray(time[:]),
+            'units': getattr(time, 'units', None),
+            'calendar': getattr(time, 'calendar', 'standard'),
+            'dimensions': {name: len(dim) for name, dim in nc.dimensions.items()},
+            'variables': {name: (var.dimensions, var.dtype.str) for name, var in nc.variables.items()},
+            'static': static,
+        }
+
+
+def _scan_candidate(filename, time_dim=TIME_DIM):
+    """
+    scan_input for a file that may not exist (None if it does not); runs in
+    a worker process.
+    """
+    if not os.path.exists(filename):
+        return None
+    return scan_input(filename, time_dim)
+
+
+def scan_inputs(filenames, time_dim=TIME_DIM, max_workers=SCAN_WORKERS):
+    """
+    Scan candidate input files concurrently in worker processes, keeping
+    their order. Missing files are reported and left out.
+    """
+    if not filenames:
+        return []
+    max_workers = max(1, min(max_workers, len(filenames)))
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(_scan_candidate, filenames, repeat(time_dim)))
+    scans = []
+    for filename, scan in zip(filenames, results):
+        if scan is None:
+            print(f"Warning: File not found - {filename}")
+        else:
+            scans.append(scan)
+    return scans
+
+
+def check_compatible(scans, time_dim=TIME_DIM):
+    """
+    Raise ValueError, listing every mismatch, unless all inputs share the
+    first one's grid (dimension sizes and time-independent variables) and
+    time-dependent variables.
+    """
+    reference = scans[0]
+    problems = []
+    for scan in scans[1:]:
+        for name, size in reference['dimensions'].items():
+            if name == time_dim:
+                continue
+            if scan['dimensions'].get(name) != size:
+                problems.append(f"{scan['file']}: dimension {name} is {scan['dimensions'].get(name)}, "
+                                f"expected {size}")
+        for name, layout in reference['variables'].items():
+            if scan['variables'].get(name) != layout:
+                problems.append(f"{scan['file']}: variable {name} is {scan['variables'].get(name)}, "
+                                f"expected {layout}")
+        for name, digest in reference['static'].items():
+            if name in scan['static'] and scan['static'][name] != digest:
+                problems.append(f"{scan['file']}: {name} values differ from {reference['file']}")
+        if scan['units'] is None and reference['units'] is not None:
+            problems.append(f"{scan['file']}: {time_dim} has no units")
+    if problems:
+        raise ValueError("Input files do not share one grid:\n  " + "\n  ".join(problems))
+
+
+def _common_times(scans):
+    """
+    Time values of every scan in the units and calendar of the first one.
+    """
+    units, calendar = scans[0]['units'], scans[0]['calendar']
+    converted = []
+    for scan in scans:
+        times = scan['times']
+        if (scan['units'], scan['calendar']) != (units, calendar):
+            dates = num2date(times, scan['units'], scan['calendar'])
+            times = np.asarray(date2num(dates, units, calendar))
+        converted.append(times)
+    return converted
+
+
+def plan_time_axis(scans):
+    """
+    Global merge plan from the scanned time coordinates.
+
+    Returns:
+    --------
+    times : numpy.ndarray
+        Sorted, unique output times (units of the first file)
+    source_file : numpy.ndarray
+        Index into scans of the file each output record comes from
+    source_index : numpy.ndarray
+        Record within that file
+    """
+    times_per_file = _common_times(scans)
+    times = np.concatenate(times_per_file)
+    source_file = np.concatenate([np.full(len(t), k) for k, t in enumerate(times_per_file)])
+    source_index = np.concatenate([np.arange(len(t)) for t in times_per_file])
+
+    # Stable sort by time keeps file order among equal times, so the first file wins
+    order = np.lexsort((source_index, source_file, times))
+    times, source_file, source_index = times[order], source_file[order], source_index[order]
+    first = np.concatenate([[True], times[1:] != times[:-1]])
+    return times[first], source_file[first], source_index[first]
+
+
+def copy_runs(out_positions, source_index, block_size=BLOCK_SIZE):
+    """
+    (out_start, out_stop, source_start, source_stop) slabs of at most
+    block_size records over which both indices advance together.
+    """
+    out_positions = np.asarray(out_positions)
+    source_index = np.asarray(source_index)
+    if len(out_positions) == 0:
+        return []
+    breaks = np.flatnonzero((np.diff(out_positions) != 1) | (np.diff(source_index) != 1)) + 1
+    bounds = np.concatenate([[0], breaks, [len(out_positions)]])
+    runs = []
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        for start in range(a, b, block_size):
+            stop = min(start + block_size, b)
+            runs.append((int(out_positions[start]), int(out_positions[stop - 1]) + 1,
+                         int(source_index[start]), int(source_index[stop - 1]) + 1))
+    return runs
+
+
+def _time_start_stop(times, units, calendar):
+    """
+    First and last time as datetime64 strings, as written in the global attributes.
+    """
+    dates = num2date(times[[0, -1]], units, calendar,
+                     only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+    return tuple(str(np.datetime64(d, 'ns')) for d in dates)
+
+
+def create_output(output_file, template, times, time_dim=TIME_DIM):
+    """
+    Output file laid out like template (an input file name) with the full
+    merged time axis. Time-dependent variables are created empty.
+    """
+    out = Dataset(output_file, 'w', format='NETCDF4')
+    with Dataset(template, 'r') as src:
+        for name, dim in src.dimensions.items():
+            out.createDimension(name, None if name == time_dim else len(dim))
+        for name, var in src.variables.items():
+            filters = var.filters() or {}
+            chunking = var.chunking()
+            kwargs = {
+                'fill_value': getattr(var, '_FillValue', None),
+                'zlib': bool(filters.get('zlib', False)),
+                'complevel': filters.get('complevel', 4),
+                'shuffle': bool(filters.get('shuffle', False)),
+            }
+            if isinstance(chunking, list):
+                kwargs['chunksizes'] = chunking
+            new = out.createVariable(name, var.dtype, var.dimensions, **kwargs)
+            new.setncatts({k: var.getncattr(k) for k in var.ncattrs() if k != '_FillValue'})
+            new.set_auto_maskandscale(False)
+            if time_dim not in var.dimensions:
+                var.set_auto_maskandscale(False)
+                new[...] = var[...]
+        out.setncatts({k: src.getncattr(k) for k in src.ncattrs()})
+    out.variables[time_dim][:] = times
+    return out
 
-def merge_structured_grid_files(base_pattern, start_id, end_id, output_file):
+
+def copy_inputs(out, scans, source_file, source_index, time_dim=TIME_DIM, block_size=BLOCK_SIZE,
+                positions=None):
+    """
+    Copy the planned records of every time-dependent variable from the
+    inputs into out, slab by slab. With positions, only those output
+    records are written.
+    """
+    names = [name for name, var in out.variables.items()
+             if name != time_dim and var.dimensions and var.dimensions[0] == time_dim]
+    selected = np.arange(len(source_file)) if positions is None else np.asarray(positions)
+    n_records = 0
+    for k, scan in enumerate(scans):
+        file_positions = selected[source_file[selected] == k]
+        if len(file_positions) == 0:
+            if positions is None:
+                print(f"Skipping {scan['file']} (all times already present)")
+            continue
+        runs = copy_runs(file_positions, source_index[file_positions], block_size)
+        print(f"Copying {len(file_positions)} records from {scan['file']}")
+        with Dataset(scan['file'], 'r') as src:
+            for name in names:
+                src_var = src.variables[name]
+                src_var.set_auto_maskandscale(False)
+                out_var = out.variables[name]
+                out_var.set_auto_maskandscale(False)
+                for out_start, out_stop, src_start, src_stop in runs:
+                    out_var[out_start:out_stop] = src_var[src_start:src_stop]
+        n_records += len(file_positions)
+    return n_records
+
+
+def manifest_file(output_file):
+    return output_file + '.manifest.json'
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _input_key(filename, output_file):
+    """
+    Input path relative to the output's directory, as stored in the manifest.
+    """
+    return os.path.relpath(os.path.abspath(filename), os.path.dirname(os.path.abspath(output_file)))
+
+
+def stat_inputs(filenames, max_workers=SCAN_WORKERS):
+    """
+    {file: size/mtime stamp, or None if missing}, stat'ed concurrently.
+    """
+    def stamp_or_none(filename):
+        try:
+            return _stamp(filename)
+        except FileNotFoundError:
+            return None
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(filenames, pool.map(stamp_or_none, filenames)))
+
+
+def load_manifest(output_file):
+    """
+    Manifest of output_file, or None if there is none or it does not
+    describe the output as it is on disk.
+    """
+    path = manifest_file(output_file)
+    if not os.path.exists(path) or not os.path.exists(output_file):
+        return None
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('output') != _stamp(output_file):
+        print(f"{output_file} does not match its manifest; merging from scratch")
+        return None
+    return manifest
+
+
+def write_manifest(output_file, scans, stamps, source_file, source_index):
+    """
+    Record the merged inputs (times in the output units) and the source of
+    every output record beside output_file.
+    """
+    reference = scans[0]
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'output': _stamp(output_file),
+        'units': reference['units'],
+        'calendar': reference['calendar'],
+        'layout': {
+            'dimensions': reference['dimensions'],
+            'variables': {name: [list(dims), dtype] for name, (dims, dtype) in reference['variables'].items()},
+            'static': reference['static'],
+        },
+        'inputs': [dict(stamps[scan['file']], file=_input_key(scan['file'], output_file),
+                        times=np.asarray(times).tolist())
+                   for scan, times in zip(scans, _common_times(scans))],
+        'plan': {'file': source_file.tolist(), 'index': source_index.tolist()},
+    }
+    tmp = manifest_file(output_file) + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_file(output_file))
+
+
+def _scan_from_manifest(filename, entry, manifest):
+    """
+    Scan of an unchanged input rebuilt from the manifest (times already in
+    the output units).
+    """
+    layout = manifest['layout']
+    return {
+        'file': filename,
+        'times': np.asarray(entry['times']),
+        'units': manifest['units'],
+        'calendar': manifest['calendar'],
+        'dimensions': layout['dimensions'],
+        'variables': {name: (tuple(dims), dtype) for name, (dims, dtype) in layout['variables'].items()},
+        'static': layout['static'],
+        'from_manifest': True,
+    }
+
+
+def records_to_update(manifest, output_file, scans, times, source_file, source_index,
+                      time_dim=TIME_DIM):
+    """
+    Output records to (re)write when the existing output can be updated in
+    place, or None when it has to be rewritten: its time axis must be an
+    unchanged prefix of the new plan.
+    """
+    with Dataset(output_file, 'r') as nc:
+        nc.set_auto_maskandscale(False)
+        old_times = np.asarray(nc.variables[time_dim][:])
+    n_old = len(old_times)
+    if len(times) < n_old or not np.array_equal(times[:n_old], old_times):
+        print("Earlier times of the merged record changed; rewriting it")
+        return None
+
+    old_inputs = [entry['file'] for entry in manifest['inputs']]
+    old_file = np.asarray(manifest['plan']['file'], dtype=np.int64)
+    old_index = np.asarray(manifest['plan']['index'], dtype=np.int64)
+    if len(old_file) != n_old:
+        print("Manifest plan does not match the merged record; rewriting it")
+        return None
+
+    keys = [_input_key(scan['file'], output_file) for scan in scans]
+    rescanned = np.array([not scan.get('from_manifest', False) for scan in scans])
+    same_source = (np.array([keys[k] for k in source_file[:n_old]], dtype=object)
+                   == np.array([old_inputs[k] for k in old_file], dtype=object))
+    same_source &= source_index[:n_old] == old_index
+    update = np.ones(len(times), dtype=bool)
+    update[:n_old] = ~same_source | rescanned[source_file[:n_old]]
+    return np.flatnonzero(update)
+
+
+def merge_structured_grid_files(base_pattern, start_id, end_id, output_file, block_size=BLOCK_SIZE,
+                                incremental=True):
     """
     Merge multiple structured grid netCDF files into a single file.
-    
+
     Parameters:
     -----------
     base_pattern : str
@@ -19,54 +395,83 @@ def merge_structured_grid_files(base_pattern, start_id, end_id, output_file):
         Ending ID number
     output_file : str
         Name of the output merged file
+    block_size : int
+        Largest number of time records copied at once
+    incremental : bool
+        Update an existing output from its manifest when possible
     """
-    # Generate list of files
-    files = []
-    for i in range(start_id, end_id + 1):
-        filename = base_pattern.format(i)
-        if os.path.exists(filename):
-            files.append(filename)
-        else:
+    candidates = [base_pattern.format(i) for i in range(start_id, end_id + 1)]
+    stamps = stat_inputs(candidates)
+    manifest = load_manifest(output_file) if incremental else None
+    known = {}
+    if manifest is not None:
+        known = {entry['file']: entry for entry in manifest['inputs']}
+
+    # Time coordinates and layout only, scanned concurrently for new or
+    # changed inputs; fields are read slab by slab while copying
+    def unchanged(filename):
+        entry = known.get(_input_key(filename, output_file))
+        return entry is not None and {'size': entry['size'], 'mtime_ns': entry['mtime_ns']} == stamps[filename]
+    fresh = {scan['file']: scan for scan in
+             scan_inputs([f for f in candidates if stamps[f] is not None and not unchanged(f)])}
+    scans = []
+    for filename in candidates:
+        if stamps[filename] is None:
             print(f"Warning: File not found - {filename}")
-    
-    if not files:
+        elif filename in fresh:
+            scans.append(fresh[filename])
+        else:
+            scans.append(_scan_from_manifest(filename, known[_input_key(filename, output_file)], manifest))
+    if not scans:
         raise ValueError("No files found to merge")
-    
+    files = [scan['file'] for scan in scans]
+
     print(f"Found {len(files)} files to merge")
-    
-    # Open all files using xarray
-    datasets = []
-    for f in files:
-        print(f"Reading {f}")
-        ds = xr.open_dataset(f)
-        datasets.append(ds)
-    
-    # Merge along the time dimension
-    print("Merging datasets...")
-    merged = xr.concat(datasets, dim='time')
-    
-    # Sort by time
-    merged = merged.sortby('time')
-    
-    # Remove any duplicate time steps
-    _, index = np.unique(merged['time'], return_index=True)
-    merged = merged.isel(time=index)
-    
-    # Update global attributes
-    merged.attrs['source'] = 'PaHM'
-    merged.attrs['field type'] = '1 hr'
-    merged.attrs['content'] = '10-meter wind components and Pressure Reduced to MSL'
-    merged.attrs['start_date'] = str(merged['time'].values[0])
-    merged.attrs['stop_date'] = str(merged['time'].values[-1])
-    
-    # Save to netCDF file
-    print(f"Saving merged data to {output_file}")
-    merged.to_netcdf(output_file)
-    
-    # Close all datasets
-    for ds in datasets:
-        ds.close()
-    
+    check_compatible(scans)
+
+    times, source_file, source_index = plan_time_axis(scans)
+    n_inputs = sum(len(scan['times']) for scan in scans)
+    print(f"Merge plan: {len(times)} unique times from {n_inputs} input records")
+
+    units, calendar = scans[0]['units'], scans[0]['calendar']
+    start_date, stop_date = _time_start_stop(times, units, calendar)
+
+    update = None
+    if manifest is not None:
+        update = records_to_update(manifest, output_file, scans, times, source_file, source_index)
+    if update is not None and len(update) == 0:
+        # Still record inputs that only added duplicate times, so they are not rescanned
+        write_manifest(output_file, scans, stamps, source_file, source_index)
+        print(f"{output_file} is up to date")
+        return
+
+    # The manifest only comes back once the output is consistent again
+    if os.path.exists(manifest_file(output_file)):
+        os.remove(manifest_file(output_file))
+
+    if update is None:
+        print(f"Saving merged data to {output_file}")
+        out = create_output(output_file, files[0], times)
+        # Update global attributes
+        out.setncatts({
+            'source': 'PaHM',
+            'field type': '1 hr',
+            'content': '10-meter wind components and Pressure Reduced to MSL',
+        })
+    else:
+        n_old = len(manifest['plan']['file'])
+        print(f"Updating {output_file}: appending {len(times) - n_old} records, "
+              f"rewriting {int(np.count_nonzero(update < n_old))} changed records")
+        out = Dataset(output_file, 'a')
+        time_var = out.variables[TIME_DIM]
+        time_var.set_auto_maskandscale(False)
+        if len(times) > n_old:
+            time_var[n_old:] = times[n_old:]
+    with out:
+        out.setncatts({'start_date': start_date, 'stop_date': stop_date})
+        copy_inputs(out, scans, source_file, source_index, block_size=block_size, positions=update)
+    write_manifest(output_file, scans, stamps, source_file, source_index)
+
     # Print summary
     with Dataset(output_file, 'r') as nc:
         print("\nMerged file summary:")
@@ -81,20 +486,23 @@ def merge_structured_grid_files(base_pattern, start_id, end_id, output_file):
             if var not in ['longitude', 'latitude', 'time']:
                 print(f"  {var}: {nc.variables[var].shape}")
 
-def verify_merged_file(output_file):
+def verify_merged_file(output_file, variables=('uwnd', 'vwnd', 'P')):
     """
     Verify the merged file for data consistency.
+
+    All variables are summarized in one chunked pass each, concurrently
+    (nc_stats), without loading any of them whole.
     """
-    with Dataset(output_file, 'r') as nc:
-        # Check for missing values
-        for var in ['uwnd', 'vwnd', 'P']:
-            data = nc.variables[var][:]
-            missing = np.sum(data == nc.variables[var]._FillValue)
-            total = np.prod(data.shape)
-            print(f"\n{var} statistics:")
-            print(f"  Total points: {total}")
-            print(f"  Missing values: {missing} ({missing/total*100:.2f}%)")
-            print(f"  Value range: {np.nanmin(data):.2f} to {np.nanmax(data):.2f}")
+    stats = file_stats(output_file, list(variables))
+    for var, s in stats.items():
+        total = s['count']
+        print(f"\n{var} statistics:")
+        print(f"  Total points: {total}")
+        print(f"  Missing values: {s['missing']} ({s['missing']/max(total, 1)*100:.2f}%)")
+        if s['nan'] or s['inf']:
+            print(f"  Warning: {s['nan']} NaN and {s['inf']} Inf values")
+        print(f"  Value range: {s['min']:.2f} to {s['max']:.2f}")
+        print(f"  Mean: {s['mean']:.2f}, std: {s['std']:.2f}")
 
 # Example usage
 if __name__ == "__main__":
@@ -102,6 +510,6 @@ if __name__ == "__main__":
     start_id = 1
     end_id = 21
     output_file = "merged_florence_structured.nc"
-    
+
     merge_structured_grid_files(base_pattern, start_id, end_id, output_file)
     verify_merged_file(output_file)
@@ -0,0 +1,177 @@
+"""
+Single-pass streaming statistics of netCDF variables.
+
+Each variable is read in blocks made of whole on-disk chunks (along the
+leading dimension, and the second one for very large records), so every
+chunk is read and decompressed once and memory stays at one block. Each
+block is reduced once to counts of fill, NaN and +/-Inf values plus
+min/max and the count, mean and sum of squared deviations of the valid
+values. The blocks are then combined with the parallel variance update
+of Chan et al.
+
+Variables are processed concurrently by a thread pool: the reductions
+run in NumPy outside the GIL, while reads hold the shared netCDF lock
+(libhdf5 is not thread-safe).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from netCDF4 import Dataset, default_fillvals
+
+from era5_esmf import NETCDF_LOCK
+
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def _blocks(var, block_bytes=BLOCK_BYTES):
+    """
+    Index tuples covering var in blocks of whole chunks of at most about
+    block_bytes (at least one chunk row).
+    """
+    shape = var.shape
+    if len(shape) == 0:
+        yield ()
+        return
+    chunking = var.chunking()
+    chunks = list(shape) if chunking == 'contiguous' or chunking is None else list(chunking)
+    itemsize = var.dtype.itemsize
+    record_bytes = int(np.prod(shape[1:], dtype=np.int64)) * itemsize
+
+    if len(shape) > 1 and record_bytes * chunks[0] > block_bytes:
+        # Split records along the second dimension as well
+        row_bytes = int(np.prod(shape[2:], dtype=np.int64)) * itemsize * chunks[0]
+        step1 = max(chunks[1], (block_bytes // max(row_bytes, 1)) // chunks[1] * chunks[1])
+        for start0 in range(0, shape[0], chunks[0]):
+            stop0 = min(start0 + chunks[0], shape[0])
+            for start1 in range(0, shape[1], step1):
+                yield (slice(start0, stop0), slice(start1, min(start1 + step1, shape[1])))
+        return
+
+    step0 = max(chunks[0], (block_bytes // max(record_bytes, 1)) // chunks[0] * chunks[0])
+    for start0 in range(0, shape[0], step0):
+        yield (slice(start0, min(start0 + step0, shape[0])),)
+
+
+def _fill_values(var):
+    """
+    Raw values that mark missing data (_FillValue, or the netCDF default
+    fill when it is not set, and missing_value).
+    """
+    values = []
+    for attr in ('_FillValue', 'missing_value'):
+        if attr in var.ncattrs():
+            values.extend(np.atleast_1d(var.getncattr(attr)).tolist())
+    # Single-byte types have no default fill, as in netCDF4 masking
+    key = var.dtype.str[1:]
+    if '_FillValue' not in var.ncattrs() and var.dtype.itemsize > 1 and key in default_fillvals:
+        values.append(default_fillvals[key])
+    return values
+
+
+def _block_stats(raw, fill_values, scale_factor, add_offset):
+    """
+    Partial statistics of one raw block.
+    """
+    raw = np.asarray(raw).ravel()
+    missing = np.zeros(raw.shape, dtype=bool)
+    for fill in fill_values:
+        missing |= raw == fill
+    data = raw.astype(np.float64)
+    if scale_factor is not None:
+        data *= scale_factor
+    if add_offset is not None:
+        data += add_offset
+
+    nan = np.isnan(data)
+    inf = np.isinf(data)
+    valid = ~(missing | nan | inf)
+    values = data[valid]
+    n = len(values)
+    stats = {'count': raw.size, 'missing': int(np.count_nonzero(missing)),
+             'nan': int(np.count_nonzero(nan & ~missing)), 'inf': int(np.count_nonzero(inf & ~missing)),
+             'valid': n, 'min': np.inf, 'max': -np.inf, 'mean': 0.0, 'm2': 0.0}
+    if n:
+        mean = values.mean()
+        stats.update(min=values.min(), max=values.max(), mean=mean,
+                     m2=float(np.square(values - mean).sum()))
+    return stats
+
+
+def _combine(a, b):
+    """
+    Merge two partial statistics (Chan et al. parallel mean/variance update).
+    """
+    n = a['valid'] + b['valid']
+    out = {key: a[key] + b[key] for key in ('count', 'missing', 'nan', 'inf', 'valid')}
+    out['min'] = min(a['min'], b['min'])
+    out['max'] = max(a['max'], b['max'])
+    if n == 0:
+        out.update(mean=0.0, m2=0.0)
+        return out
+    delta = b['mean'] - a['mean']
+    out['mean'] = a['mean'] + delta * b['valid'] / n
+    out['m2'] = a['m2'] + b['m2'] + delta**2 * a['valid'] * b['valid'] / n
+    return out
+
+
+def variable_stats(nc, name, block_bytes=BLOCK_BYTES):
+    """
+    Statistics of one variable of an open Dataset in a single chunked pass.
+
+    Returns:
+    --------
+    dict
+        count (all points), missing (fill/missing_value), nan, inf, valid,
+        and min, max, mean, std of the valid points (NaN when there are none)
+    """
+    var = nc.variables[name]
+    with NETCDF_LOCK:
+        var.set_auto_maskandscale(False)
+        fill_values = _fill_values(var)
+        scale_factor = getattr(var, 'scale_factor', None)
+        add_offset = getattr(var, 'add_offset', None)
+        blocks = list(_blocks(var, block_bytes))
+
+    total = _block_stats(np.empty(0, dtype=var.dtype), fill_values, scale_factor, add_offset)
+    for index in blocks:
+        with NETCDF_LOCK:
+            raw = var[index]
+        total = _combine(total, _block_stats(raw, fill_values, scale_factor, add_offset))
+
+    if total['valid'] == 0:
+        total.update(min=np.nan, max=np.nan, mean=np.nan)
+        total['std'] = np.nan
+    else:
+        total['std'] = float(np.sqrt(total['m2'] / total['valid']))
+    del total['m2']
+    return total
+
+
+def file_stats(filename, variables=None, max_workers=None, block_bytes=BLOCK_BYTES):
+    """
+    variable_stats for several variables of a file, computed concurrently.
+
+    Parameters:
+    -----------
+    filename : str
+        netCDF file
+    variables : list of str, optional
+        Variables to summarize (default: all numeric non-coordinate variables)
+    max_workers : int, optional
+        Threads (default: one per variable, at most the CPU count)
+
+    Returns:
+    --------
+    dict
+        variable name -> statistics, in the order of variables
+    """
+    with Dataset(filename, 'r') as nc:
+        if variables is None:
+            variables = [name for name, var in nc.variables.items()
+                         if name not in nc.dimensions and var.dtype.kind in 'iuf']
+        max_workers = max_workers or max(1, min(len(variables), os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(lambda name: variable_stats(nc, name, block_bytes), variables)
+            return dict(zip(variables, results))
@@ -0,0 +1,206 @@
+"""
+Bulk reader for whitespace-separated station observation files.
+
+Handles the text records used throughout this repository, e.g. the Duck
+wind file WSPD_SANDY/spd_dir2.txt:
+
+    10/27/2012 0:00	7.435	52.684
+
+The whole file goes through pandas' C parser in one call, with the
+timestamp tokens kept as text and the value columns read as float64. The
+timestamp tokens alone then have their date/time separators ('/', ':', '-')
+turned into blanks and go through the C parser a second time as plain
+numbers, so values such as -0.108 are never touched. Timestamps are assembled from the integer year/month/day/hour/
+minute columns with datetime64 arithmetic (no per-row strptime).
+
+Nothing in a record aborts the read: a file with non-numeric tokens is
+re-read as text and converted with pd.to_numeric, and non-numeric or
+missing values, short rows and malformed or impossible timestamps all fail
+one combined validity mask (together with the value range checks), so
+those rows are dropped.
+
+With use_cache=True the parsed columns are kept in a binary sidecar
+(file_cache) and memory-mapped on the next read while the file is unchanged.
+"""
+
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+from file_cache import load_arrays, save_arrays
+
+OBS_TIME_FORMAT = '%m/%d/%Y %H:%M'
+
+# strptime directives understood by the reader and their valid ranges
+TIME_FIELDS = {'Y': (1, 9999), 'm': (1, 12), 'd': (1, 31), 'H': (0, 23), 'M': (0, 59), 'S': (0, 59)}
+
+WIND_RANGES = {'speed': (0, 100), 'direction': (0, 360)}
+
+
+def _time_fields(time_format):
+    """
+    Directives of time_format in order and the separator characters between them.
+    """
+    fields = re.findall(r'%(.)', time_format)
+    unknown = [f for f in fields if f not in TIME_FIELDS]
+    if unknown:
+        raise ValueError(f"Unsupported directives {unknown} in time format '{time_format}'")
+    separators = set(re.sub(r'%.', '', time_format)) - set(' \t')
+    return fields, separators
+
+
+def assemble_times(parts):
+    """
+    datetime64[s] from integer 'Y', 'm', 'd' (and optional 'H', 'M', 'S')
+    arrays, plus a mask of rows that form a valid calendar time.
+    """
+    year, month, day = parts['Y'], parts['m'], parts['d']
+    n = len(year)
+    zeros = np.zeros(n, dtype=np.int64)
+    hour, minute, second = (parts.get(k, zeros) for k in ('H', 'M', 'S'))
+
+    valid = np.ones(n, dtype=bool)
+    for key, values in parts.items():
+        low, high = TIME_FIELDS[key]
+        valid &= (values >= low) & (values <= high)
+
+    # Invalid rows get a harmless placeholder date so the arithmetic stays defined
+    year = np.where(valid, year, 1970).astype(np.int64)
+    month = np.where(valid, month, 1).astype(np.int64)
+    day = np.where(valid, day, 1).astype(np.int64)
+
+    months = (year - 1970) * 12 + (month - 1)
+    month_start = months.astype('datetime64[M]')
+    days = month_start.astype('datetime64[D]') + (day - 1)
+    # 31 April etc. roll into the next month
+    valid &= days.astype('datetime64[M]') == month_start
+
+    seconds = hour.astype(np.int64) * 3600 + minute.astype(np.int64) * 60 + second.astype(np.int64)
+    times = days.astype('datetime64[s]') + np.where(valid, seconds, 0).astype('timedelta64[s]')
+    return times, valid
+
+
+def _read_numeric(source, names, numeric, **kwargs):
+    """
+    Whitespace-separated text through pandas' C parser with the numeric
+    columns as float64. If any token cannot be converted (non-numeric, or a
+    blank from a short row), the text is read again as strings and those
+    tokens become NaN instead of failing the whole read.
+    """
+    kwargs = dict(sep=r'\s+', header=None, engine='c', names=names, keep_default_na=False, **kwargs)
+    try:
+        return pd.read_csv(source, dtype={name: np.float64 if name in numeric else str
+                                          for name in names}, **kwargs)
+    except ValueError:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        frame = pd.read_csv(source, dtype=str, **kwargs)
+        for name in numeric:
+            frame[name] = pd.to_numeric(frame[name], errors='coerce')
+        return frame
+
+
+def read_station_file(filename, columns, time_format=OBS_TIME_FORMAT, valid_ranges=None,
+                      use_cache=False, na_values=('MM', 'NaN', 'nan', '-'), skiprows=0):
+    """
+    Read a station text file with a timestamp followed by value columns.
+
+    Parameters:
+    -----------
+    filename : str
+        Whitespace-separated text file (header lines skipped with skiprows)
+    columns : list of str
+        Names of the value columns after the timestamp
+    time_format : str
+        strptime-style format of the timestamp, which may span several
+        whitespace-separated fields (default '%m/%d/%Y %H:%M')
+    valid_ranges : dict, optional
+        column -> (min, max); rows outside any range are dropped
+    use_cache : bool
+        Keep/reuse a binary copy of the parsed columns next to the file
+    na_values : sequence of str
+        Tokens read as missing values (rows with missing or non-numeric
+        values, short rows and bad timestamps are dropped)
+    skiprows : int
+        Header lines to skip
+
+    Returns:
+    --------
+    pandas.DataFrame
+        'datetime' (datetime64) followed by the value columns (float64)
+    """
+    columns = list(columns)
+    valid_ranges = valid_ranges or {}
+    key = {'columns': columns, 'time_format': time_format, 'skiprows': skiprows,
+           'valid_ranges': {k: list(v) for k, v in valid_ranges.items()},
+           'na_values': list(na_values)}
+
+    if use_cache:
+        cached = load_arrays(filename, key)
+        if cached is not None:
+            return _frame(cached, columns)
+
+    fields, separators = _time_fields(time_format)
+    tokens = [f'_t{i}' for i in range(len(time_format.split()))]
+    names = tokens + columns
+    # Fields beyond the expected ones are ignored, missing ones are NaN
+    data = _read_numeric(filename, names, columns, skiprows=skiprows, usecols=range(len(names)),
+                         na_values={name: list(na_values) for name in columns})
+
+    # Only the timestamp tokens are split on the separators. Each line starts
+    # with its row number, so lines that split into too many fields can be
+    # skipped by the parser and still be matched back to their row
+    stamps = data[tokens[0]].fillna('NA').str.cat([data[name].fillna('NA') for name in tokens[1:]],
+                                                  sep=' ')
+    time_parts = np.full((len(data), len(fields)), np.nan)
+    if len(data):
+        rows = np.arange(len(data)).astype(str).astype(object)
+        text = '\n'.join((rows + ' ' + stamps.to_numpy(dtype=object)).tolist()).encode()
+        if separators:
+            table = bytes.maketrans(''.join(sorted(separators)).encode(), b' ' * len(separators))
+            text = text.translate(table)
+        time_text = _read_numeric(io.BytesIO(text), ['_row'] + fields, fields,
+                                  na_values={field: ['NA'] for field in fields},
+                                  on_bad_lines='skip')
+        time_parts[time_text['_row'].to_numpy(np.int64)] = time_text[fields].to_numpy(np.float64)
+
+    # One combined mask: parseable, calendar-valid timestamps and in-range values
+    valid = np.isfinite(time_parts).all(axis=1) & (time_parts == np.round(time_parts)).all(axis=1)
+    parts = {field: np.nan_to_num(time_parts[:, i]).astype(np.int64)
+             for i, field in enumerate(fields)}
+    times, time_ok = assemble_times(parts)
+    valid &= time_ok
+
+    values = data[columns].to_numpy(np.float64)
+    with np.errstate(invalid='ignore'):
+        valid &= np.isfinite(values).all(axis=1)
+        for name, (low, high) in valid_ranges.items():
+            col = values[:, columns.index(name)]
+            valid &= (col >= low) & (col <= high)
+
+    n_dropped = int(len(valid) - valid.sum())
+    if n_dropped:
+        print(f"{filename}: dropped {n_dropped} of {len(valid)} records "
+              f"(bad timestamp, missing or out-of-range value)")
+
+    arrays = {'datetime': times[valid].astype(np.int64)}
+    arrays.update({name: np.ascontiguousarray(values[valid, i]) for i, name in enumerate(columns)})
+    if use_cache:
+        save_arrays(filename, arrays, key)
+    return _frame(arrays, columns)
+
+
+def _frame(arrays, columns):
+    frame = {'datetime': np.asarray(arrays['datetime'], dtype=np.int64).astype('datetime64[s]')}
+    frame.update({name: np.asarray(arrays[name]) for name in columns})
+    return pd.DataFrame(frame)
+
+
+def read_wind_file(filename, valid_ranges=WIND_RANGES, use_cache=False):
+    """
+    Station wind file: timestamp, speed (m/s), direction (degrees).
+    """
+    return read_station_file(filename, ['speed', 'direction'], valid_ranges=valid_ranges,
+                             use_cache=use_cache)
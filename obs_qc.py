@@ -0,0 +1,203 @@
+"""
+Quality control and regular resampling of station observation series.
+
+All tests work on whole arrays; the result is one flag bit mask per record:
+
+    DUPLICATE   repeated timestamp (the first record is kept)
+    MISSING     non-finite value
+    RANGE       value outside valid_range
+    RATE        isolated jump: rate of change to both neighbours above max_rate
+    SPIKE       more than n_mad scaled MADs from the median of a centred
+                window of mad_window records (Hampel test)
+
+Gaps longer than max_gap are reported and, when resampling onto a regular
+axis, masked instead of being bridged by interpolation.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from time_encoding import seconds_since_1970_to_datetime64, regular_time_axis
+from time_interp import _as_seconds, interpolate_series
+
+DUPLICATE = 1
+MISSING = 2
+RANGE = 4
+RATE = 8
+SPIKE = 16
+FLAG_NAMES = {DUPLICATE: 'duplicate', MISSING: 'missing', RANGE: 'range', RATE: 'rate', SPIKE: 'spike'}
+
+# Normal-consistent scale of the median absolute deviation
+MAD_SCALE = 1.4826
+MAD_BLOCK = 65536
+
+
+def find_gaps(seconds, max_gap=None):
+    """
+    Gaps in a sorted time axis (seconds since 1970).
+
+    max_gap defaults to 1.5 times the median spacing. Returns (start, end)
+    int64 arrays: the last time before and the first time after each gap.
+    """
+    seconds = np.asarray(seconds, dtype=np.int64)
+    spacing = np.diff(seconds)
+    if len(spacing) == 0:
+        return seconds[:0], seconds[:0]
+    if max_gap is None:
+        max_gap = 1.5 * np.median(spacing)
+    index = np.flatnonzero(spacing > max_gap)
+    return seconds[index], seconds[index + 1]
+
+
+def rate_flags(seconds, values, max_rate):
+    """
+    Records whose rate of change (units per second) exceeds max_rate both
+    from the previous and to the next record, i.e. isolated jumps. The
+    first and last records have only one neighbour and are never flagged
+    (a single fast change cannot tell the spike from a genuine step).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flags = np.zeros(len(values), dtype=bool)
+    if len(values) < 3:
+        return flags
+    rate = np.abs(np.diff(values)) / np.diff(np.asarray(seconds, dtype=np.float64))
+    fast = rate > max_rate
+    flags[1:-1] = fast[:-1] & fast[1:]
+    return flags
+
+
+def rolling_mad_flags(values, window, n_mad=5.0, min_mad=0.0):
+    """
+    Hampel test: records further than n_mad * 1.4826 * MAD from the median
+    of the window records centred on them (shifted inward at the ends).
+
+    The windows are strided views, reduced in blocks of MAD_BLOCK records
+    so memory stays bounded on multi-year 1-minute records. min_mad keeps
+    flat stretches (MAD 0) from flagging small changes.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n < window:
+        return np.zeros(n, dtype=bool)
+    windows = sliding_window_view(values, window)
+    starts = np.clip(np.arange(n) - window // 2, 0, n - window)
+
+    flags = np.empty(n, dtype=bool)
+    for first in range(0, n, MAD_BLOCK):
+        last = min(first + MAD_BLOCK, n)
+        block = windows[starts[first:last]]
+        median = np.median(block, axis=1)
+        mad = np.median(np.abs(block - median[:, None]), axis=1)
+        scale = np.maximum(MAD_SCALE * mad, min_mad)
+        flags[first:last] = np.abs(values[first:last] - median) > n_mad * scale
+    return flags
+
+
+def qc_series(times, values, valid_range=None, max_rate=None, mad_window=None, n_mad=5.0,
+              min_mad=0.0, max_gap=None, label='Observations'):
+    """
+    Sort a series and flag bad records.
+
+    Parameters:
+    -----------
+    times : array-like
+        Timestamps (datetime64, or seconds since 1970), any order
+    values : array-like
+        Values, one per timestamp
+    valid_range : (min, max), optional
+        Physically possible values
+    max_rate : float, optional
+        Largest plausible rate of change per second (RATE test)
+    mad_window : int, optional
+        Records per Hampel window (SPIKE test)
+    n_mad, min_mad : float
+        Hampel threshold in scaled MADs and lower bound on the scale
+    max_gap : float, optional
+        Gap length in seconds for the report (default 1.5 x median spacing)
+    label : str
+        Name for the printed summary
+
+    Returns:
+    --------
+    seconds : numpy.ndarray
+        Sorted int64 seconds since 1970
+    values : numpy.ndarray
+        float64 values in the same order
+    flags : numpy.ndarray
+        uint8 bit mask per record, 0 for good records
+    """
+    seconds = _as_seconds(times)
+    values = np.asarray(values, dtype=np.float64)
+    if len(seconds) != len(values):
+        raise ValueError(f"{len(seconds)} timestamps for {len(values)} values")
+    order = np.argsort(seconds, kind='stable')
+    seconds, values = seconds[order], values[order]
+
+    flags = np.zeros(len(values), dtype=np.uint8)
+    flags[1:][np.diff(seconds) == 0] |= DUPLICATE
+    flags[~np.isfinite(values)] |= MISSING
+    if valid_range is not None:
+        low, high = valid_range
+        with np.errstate(invalid='ignore'):
+            flags[(values < low) | (values > high)] |= RANGE
+
+    # Rate and spike tests only look at records that passed so far
+    good = np.flatnonzero(flags == 0)
+    if max_rate is not None:
+        flags[good[rate_flags(seconds[good], values[good], max_rate)]] |= RATE
+    if mad_window is not None:
+        flags[good[rolling_mad_flags(values[good], mad_window, n_mad, min_mad)]] |= SPIKE
+
+    # Gaps in the sampling itself; records removed by the value tests do not count
+    gap_start, gap_end = find_gaps(seconds[(flags & (DUPLICATE | MISSING)) == 0], max_gap)
+    summary = ', '.join(f"{int(np.count_nonzero(flags & bit))} {name}"
+                        for bit, name in FLAG_NAMES.items() if np.any(flags & bit))
+    print(f"{label}: {int(np.count_nonzero(flags == 0))}/{len(flags)} records pass QC"
+          + (f" ({summary})" if summary else ""))
+    if len(gap_start):
+        longest = int(np.argmax(gap_end - gap_start))
+        print(f"{label}: {len(gap_start)} gaps, longest "
+              f"{seconds_since_1970_to_datetime64(gap_start[longest])} to "
+              f"{seconds_since_1970_to_datetime64(gap_end[longest])}")
+    return seconds, values, flags
+
+
+def resample_regular(seconds, values, step_seconds, start=None, end=None, max_gap=None,
+                     flags=None):
+    """
+    Interpolate good records onto a regular axis.
+
+    Parameters:
+    -----------
+    seconds, values :
+        Sorted series, e.g. from qc_series
+    step_seconds : int
+        Output spacing
+    start, end : datetime-like, optional
+        Output range (default: the first and last good record)
+    max_gap : float, optional
+        Output steps inside longer gaps between good records are masked
+    flags : array-like, optional
+        Records with non-zero flags are left out
+
+    Returns:
+    --------
+    times : numpy.ndarray
+        datetime64[s] regular axis
+    values : numpy.ndarray
+        Interpolated values, NaN where masked
+    valid : numpy.ndarray of bool
+        Steps with an observation-based value
+    """
+    seconds = np.asarray(seconds, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if flags is not None:
+        good = np.asarray(flags) == 0
+        seconds, values = seconds[good], values[good]
+    if len(seconds) == 0:
+        raise ValueError("No good records to resample")
+    start = seconds_since_1970_to_datetime64(seconds[0]) if start is None else start
+    end = seconds_since_1970_to_datetime64(seconds[-1]) if end is None else end
+    times = regular_time_axis(start, end, step_seconds)
+    resampled, valid = interpolate_series(seconds, values, times, max_gap=max_gap)
+    return times, resampled, valid
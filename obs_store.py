@@ -0,0 +1,207 @@
+"""
+Columnar store for station observation time series.
+
+A store is a directory laid out as
+
+    index.json                        station id -> station metadata and variables
+    <station>/<variable>.time.npy     int64 seconds since 1970-01-01, increasing
+    <station>/<variable>.values.npy   float32 values
+
+index.json records each variable's units, record count and first/last time,
+so the stations covering a window are found without opening any array.
+Arrays are memory-mapped and a time window is cut with searchsorted, so
+loading a few days of a multi-year record only touches those pages.
+
+The Sandy records used by the scripts in this repository are kept in
+OBS_STORE/ (station 'duck', NOAA 8651370). Text files are imported with
+
+    python obs_store.py OBS_STORE duck WSPD_SANDY/spd_dir2.txt speed direction --units m/s degree
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from obs_io import OBS_TIME_FORMAT, read_station_file
+from time_encoding import to_datetime64, seconds_since_1970_to_datetime64
+from time_interp import prepare_series
+
+
+class ObsStore:
+    """
+    Observation store rooted at a directory (created on the first write).
+
+    Parameters:
+    -----------
+    root : str
+        Store directory
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index_file = os.path.join(root, 'index.json')
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.index_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=2, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp, self.index_file)
+
+    def _paths(self, station, variable):
+        base = os.path.join(self.root, station, variable)
+        return base + '.time.npy', base + '.values.npy'
+
+    def info(self, station, variable=None):
+        """
+        Index entry of a station, or of one of its variables.
+        """
+        if station not in self.index:
+            raise KeyError(f"Station '{station}' not in store {self.root}")
+        entry = self.index[station]
+        if variable is None:
+            return entry
+        if variable not in entry['variables']:
+            raise KeyError(f"No '{variable}' for station '{station}' in store {self.root} "
+                           f"(available: {sorted(entry['variables'])})")
+        return entry['variables'][variable]
+
+    def stations(self, variable=None, start=None, end=None):
+        """
+        Station ids that have variable (any, if None) with records between
+        start and end (inclusive, None for open ends).
+        """
+        start = None if start is None else to_datetime64(start)
+        end = None if end is None else to_datetime64(end)
+        found = []
+        for station, entry in sorted(self.index.items()):
+            names = entry['variables'] if variable is None else [variable]
+            for name in names:
+                var = entry['variables'].get(name)
+                if var is None:
+                    continue
+                if start is not None and to_datetime64(var['end']) < start:
+                    continue
+                if end is not None and to_datetime64(var['start']) > end:
+                    continue
+                found.append(station)
+                break
+        return found
+
+    def set_station(self, station, **attrs):
+        """
+        Create a station or update its metadata (e.g. name, lon, lat).
+        """
+        entry = self.index.setdefault(station, {'variables': {}})
+        entry.update({k: v for k, v in attrs.items() if v is not None})
+        self._save_index()
+
+    def write(self, station, variable, times, values, units=None, source=None):
+        """
+        Store (replace) one variable of a station. Records are sorted, the
+        first of duplicate timestamps is kept and non-finite values are dropped.
+        """
+        seconds, values = prepare_series(times, values)
+        time_file, values_file = self._paths(station, variable)
+        os.makedirs(os.path.dirname(time_file), exist_ok=True)
+        np.save(time_file, seconds.astype(np.int64))
+        np.save(values_file, values.astype(np.float32))
+
+        entry = self.index.setdefault(station, {'variables': {}})
+        entry['variables'][variable] = {
+            'units': units,
+            'n': int(len(seconds)),
+            'start': str(seconds_since_1970_to_datetime64(seconds[0])) if len(seconds) else None,
+            'end': str(seconds_since_1970_to_datetime64(seconds[-1])) if len(seconds) else None,
+            'source': source,
+        }
+        self._save_index()
+        print(f"Stored {len(seconds)} records of {station}/{variable}")
+
+    def load(self, station, variable, start=None, end=None, mmap=True):
+        """
+        Records of one variable between start and end (inclusive).
+
+        Returns:
+        --------
+        times : numpy.ndarray
+            datetime64[s]
+        values : numpy.ndarray
+            float32; a read-only memory-mapped slice when mmap is True
+        """
+        self.info(station, variable)
+        time_file, values_file = self._paths(station, variable)
+        mmap_mode = 'r' if mmap else None
+        seconds = np.load(time_file, mmap_mode=mmap_mode)
+        values = np.load(values_file, mmap_mode=mmap_mode)
+
+        first, last = 0, len(seconds)
+        if start is not None:
+            first = int(np.searchsorted(seconds, to_datetime64(start).astype(np.int64), side='left'))
+        if end is not None:
+            last = int(np.searchsorted(seconds, to_datetime64(end).astype(np.int64), side='right'))
+        return seconds[first:last].view('datetime64[s]'), values[first:last]
+
+    def load_frame(self, station, variables, start=None, end=None):
+        """
+        DataFrame with a 'datetime' column and one column per variable;
+        variables on different time axes are outer-joined (NaN where missing).
+        """
+        series = [self.load(station, name, start, end) for name in variables]
+        times = series[0][0]
+        if all(np.array_equal(t, times) for t, _ in series[1:]):
+            frame = {'datetime': np.array(times)}
+            frame.update({name: np.array(v) for name, (_, v) in zip(variables, series)})
+            return pd.DataFrame(frame)
+        joined = pd.concat([pd.Series(np.array(v), index=np.array(t), name=name)
+                            for name, (t, v) in zip(variables, series)], axis=1)
+        return joined.rename_axis('datetime').reset_index()
+
+    def import_text(self, filename, station, variables, units=None, time_format=OBS_TIME_FORMAT,
+                    skiprows=0, valid_ranges=None):
+        """
+        Bulk import a station text file (timestamp followed by value
+        columns, see obs_io.read_station_file), one stored variable per column.
+        """
+        df = read_station_file(filename, variables, time_format=time_format,
+                               valid_ranges=valid_ranges, skiprows=skiprows)
+        units = list(units) if units is not None else [None] * len(variables)
+        if len(units) != len(variables):
+            raise ValueError(f"{len(units)} units given for {len(variables)} variables")
+        times = df['datetime'].to_numpy()
+        for name, unit in zip(variables, units):
+            self.write(station, name, times, df[name].to_numpy(), units=unit,
+                       source=os.path.basename(filename))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import a station text file into an observation store')
+    parser.add_argument('root', help='Store directory')
+    parser.add_argument('station', help='Station id')
+    parser.add_argument('file', help='Text file: timestamp followed by value columns')
+    parser.add_argument('variables', nargs='+', help='Names of the value columns')
+    parser.add_argument('--units', nargs='+', help='Units, one per variable')
+    parser.add_argument('--time-format', default=OBS_TIME_FORMAT, help='Timestamp format')
+    parser.add_argument('--skiprows', type=int, default=0, help='Header lines to skip')
+    parser.add_argument('--name', help='Station name')
+    parser.add_argument('--lon', type=float, help='Station longitude')
+    parser.add_argument('--lat', type=float, help='Station latitude')
+    args = parser.parse_args()
+
+    store = ObsStore(args.root)
+    store.import_text(args.file, args.station, args.variables, units=args.units,
+                      time_format=args.time_format, skiprows=args.skiprows)
+    store.set_station(args.station, name=args.name, lon=args.lon, lat=args.lat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Model-versus-observation skill metrics for many stations at once.
+
+Model and observations are laid out as (..., time) matrices, typically
+(station, time) or (station, variable, time), on a common time axis with
+NaN where either side is missing. Every metric is a masked NumPy reduction
+over the last axis, so all stations and variables are scored together:
+
+    bias          mean(model - obs)
+    rmse          sqrt(mean((model - obs)^2))
+    corr          Pearson correlation
+    willmott      index of agreement d (Willmott 1981), 1 is a perfect match
+    peak_error    max(model) - max(obs)
+    peak_timing   time of the model peak minus time of the observed peak (s)
+
+Only time steps where both series are finite count, so a gauge with gaps
+is scored on the steps it has.
+"""
+
+import numpy as np
+import pandas as pd
+
+from time_encoding import datetime64_to_seconds_since_1970
+from time_interp import interpolate_series
+
+METRICS = ('n', 'bias', 'rmse', 'corr', 'willmott', 'peak_error', 'peak_timing')
+
+
+def align_observations(obs_series, target_times, max_gap=None):
+    """
+    Interpolate each station's observations to the model time axis.
+
+    Parameters:
+    -----------
+    obs_series : list of (times, values)
+        Observation timestamps and values per station (any spacing)
+    target_times : array-like
+        Model output times
+    max_gap : float or None
+        Steps inside observation gaps longer than this (seconds) are NaN
+
+    Returns:
+    --------
+    numpy.ndarray
+        (n_station, n_times) observations on target_times, NaN where missing
+    """
+    aligned = np.full((len(obs_series), len(target_times)), np.nan)
+    for k, (times, values) in enumerate(obs_series):
+        if len(times) == 0:
+            continue
+        aligned[k], _ = interpolate_series(times, values, target_times, max_gap=max_gap)
+    return aligned
+
+
+def skill_metrics(model, obs, times=None):
+    """
+    Skill of model against obs along the last axis.
+
+    Parameters:
+    -----------
+    model, obs : array-like
+        Broadcastable (..., n_times) arrays; NaN marks missing steps
+    times : array-like, optional
+        (n_times,) time axis for peak_timing in seconds; without it
+        peak_timing is in time steps
+
+    Returns:
+    --------
+    dict
+        metric name -> (...) array; NaN where fewer than two steps are valid
+    """
+    model, obs = np.broadcast_arrays(np.asarray(model, dtype=np.float64),
+                                     np.asarray(obs, dtype=np.float64))
+    valid = np.isfinite(model) & np.isfinite(obs)
+    n = valid.sum(axis=-1)
+    enough = n >= 2
+    count = np.where(enough, n, 1)
+
+    m = np.where(valid, model, 0.0)
+    o = np.where(valid, obs, 0.0)
+    diff = m - o
+    bias = diff.sum(axis=-1) / count
+    rmse = np.sqrt((diff**2).sum(axis=-1) / count)
+
+    m_mean = m.sum(axis=-1) / count
+    o_mean = o.sum(axis=-1) / count
+    m_anom = np.where(valid, m - m_mean[..., None], 0.0)
+    o_anom = np.where(valid, o - o_mean[..., None], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = (m_anom * o_anom).sum(axis=-1) / np.sqrt((m_anom**2).sum(axis=-1)
+                                                        * (o_anom**2).sum(axis=-1))
+        potential = ((np.abs(m - o_mean[..., None]) + np.abs(o_anom))**2 * valid).sum(axis=-1)
+        willmott = 1.0 - (diff**2).sum(axis=-1) / potential
+
+    m_peak = np.where(valid, model, -np.inf).argmax(axis=-1)
+    o_peak = np.where(valid, obs, -np.inf).argmax(axis=-1)
+    peak_error = (np.take_along_axis(model, m_peak[..., None], axis=-1)[..., 0]
+                  - np.take_along_axis(obs, o_peak[..., None], axis=-1)[..., 0])
+    if times is None:
+        peak_timing = (m_peak - o_peak).astype(np.float64)
+    else:
+        seconds = datetime64_to_seconds_since_1970(times)
+        peak_timing = (seconds[m_peak] - seconds[o_peak]).astype(np.float64)
+
+    metrics = {'n': n, 'bias': bias, 'rmse': rmse, 'corr': corr, 'willmott': willmott,
+               'peak_error': peak_error, 'peak_timing': peak_timing}
+    for name in METRICS[1:]:
+        metrics[name] = np.where(enough, metrics[name], np.nan)
+    return metrics
+
+
+def skill_table(model, obs, times=None, names=None):
+    """
+    skill_metrics of (n_station, n_times) arrays as a DataFrame, one row
+    per station.
+    """
+    metrics = skill_metrics(model, obs, times)
+    table = pd.DataFrame({name: np.atleast_1d(metrics[name]) for name in METRICS})
+    if names is not None:
+        table.index = pd.Index(list(names), name='station')
+    return table
+
+
+def score_stations(model_times, model_values, obs_series, names=None, max_gap=None):
+    """
+    Align each station's observations to the model output and score it.
+
+    Parameters:
+    -----------
+    model_times : array-like
+        (n_times,) model output times
+    model_values : array-like
+        (n_station, n_times) model series at the stations
+    obs_series : list of (times, values)
+        Observations per station, e.g. from ObsStore.load
+    names : list of str, optional
+        Station names for the table index
+    max_gap : float or None
+        Largest observation gap (seconds) bridged when aligning
+
+    Returns:
+    --------
+    pandas.DataFrame
+        One row per station with the columns of METRICS
+    """
+    obs = align_observations(obs_series, model_times, max_gap=max_gap)
+    return skill_table(model_values, obs, model_times, names)
@@ -0,0 +1,179 @@
+"""
+SCHISM ASCII time-history (*.th) files: elev.th, flux.th, TEM_1.th, ...
+
+Each line is a time followed by one value per boundary/column:
+
+    0	0.437
+    1800	0.329
+
+Rows are formatted a block at a time with one '%' operation on a
+repeated row format, instead of one f-string per pandas row, and each
+block goes to the file in a single write, so multi-million row
+1-minute records are written in seconds.
+
+read_th memory-maps the file and walks it in fixed-size byte blocks cut
+at line ends: one pass counts the lines to preallocate the result, a
+second parses each block with pandas' C tokenizer into it. Memory beyond
+the result is one block, whatever the file size. The result is kept in a binary sidecar
+(file_cache), so later opens of an unchanged file are a memory-mapped load.
+"""
+
+import io
+import mmap
+
+import numpy as np
+import pandas as pd
+
+from file_cache import load_arrays, save_arrays
+from time_encoding import to_datetime64
+
+BLOCK_ROWS = 65536
+READ_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def model_seconds(times, start=None):
+    """
+    int64 seconds of times since start (default: the first time), the
+    time column of SCHISM .th inputs.
+    """
+    times = to_datetime64(times)
+    start = times[0] if start is None else to_datetime64(start)
+    return (times - start).astype(np.int64)
+
+
+def format_rows(time, values, time_fmt='%d', value_fmt='%.3f', sep='\t'):
+    """
+    Text of the rows (time[i], values[i, :]), one line per row.
+
+    Parameters:
+    -----------
+    time : array-like
+        First column; numbers, or strings with time_fmt='%s'
+    values : array-like
+        (n,) or (n, n_columns) values
+    time_fmt, value_fmt : str
+        printf-style formats of the time column and of every value column
+    sep : str
+        Column separator
+    """
+    time = np.asarray(time)
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values[:, None]
+    n_rows, n_columns = values.shape
+    if len(time) != n_rows:
+        raise ValueError(f"{len(time)} times for {n_rows} rows of values")
+
+    row_fmt = sep.join([time_fmt] + [value_fmt] * n_columns) + '\n'
+    cells = np.empty((n_rows, n_columns + 1), dtype=object)
+    cells[:, 0] = time.tolist()
+    cells[:, 1:] = values.tolist()
+    return (row_fmt * n_rows) % tuple(cells.ravel().tolist())
+
+
+def write_th(filename, time, values, time_fmt='%d', value_fmt='%.3f', sep='\t', header=None,
+             block_rows=BLOCK_ROWS):
+    """
+    Write a time-history text file block by block.
+
+    Parameters:
+    -----------
+    filename : str
+        Output file (overwritten)
+    time, values, time_fmt, value_fmt, sep :
+        As in format_rows
+    header : str, optional
+        First line (without newline), e.g. "Time(s)\\tWater_Level(m)"
+    block_rows : int
+        Rows formatted per write
+    """
+    time = np.asarray(time)
+    values = np.asarray(values)
+    with open(filename, 'w') as f:
+        if header is not None:
+            f.write(header + '\n')
+        for start in range(0, len(time), block_rows):
+            stop = min(start + block_rows, len(time))
+            f.write(format_rows(time[start:stop], values[start:stop], time_fmt, value_fmt, sep))
+
+
+def _line_blocks(mm, block_bytes):
+    """
+    (start, stop) byte ranges of about block_bytes covering mm, each ending
+    at a line end (or the end of the file).
+    """
+    size = len(mm)
+    start = 0
+    while start < size:
+        stop = min(start + block_bytes, size)
+        if stop < size:
+            newline = mm.rfind(b'\n', start, stop)
+            if newline < 0:
+                # A single line longer than the block extends it to its end
+                newline = mm.find(b'\n', stop)
+            stop = newline + 1 if newline >= 0 else size
+        yield start, stop
+        start = stop
+
+
+def read_th(filename, use_cache=True, block_bytes=READ_BLOCK_BYTES):
+    """
+    Read a whitespace-separated numeric time-history file.
+
+    Parameters:
+    -----------
+    filename : str
+        .th file (time column followed by value columns, no header)
+    use_cache : bool
+        Keep/reuse a binary copy next to the file (<file>.npcache/), keyed
+        by the file's size and mtime
+    block_bytes : int
+        Approximate bytes counted or parsed at once
+
+    Returns:
+    --------
+    numpy.ndarray
+        (n_times, n_columns) float64, as np.loadtxt; read-only and
+        memory-mapped when it comes from the cache
+    """
+    key = {'reader': 'th'}
+    if use_cache:
+        cached = load_arrays(filename, key)
+        if cached is not None:
+            return cached['data']
+
+    with open(filename, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            raise ValueError(f"{filename} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            blocks = list(_line_blocks(mm, block_bytes))
+            # Upper bound on the rows (blank lines included), counted block by block
+            n_lines = sum(mm[start:stop].count(b'\n') for start, stop in blocks)
+            if mm[-1:] != b'\n':
+                n_lines += 1
+
+            data = None
+            n_rows = 0
+            for start, stop in blocks:
+                chunk = mm[start:stop]
+                if not chunk.strip():
+                    continue
+                block = pd.read_csv(io.BytesIO(chunk), sep=r'\s+', header=None,
+                                    engine='c', dtype=np.float64).to_numpy()
+                if data is None:
+                    data = np.empty((n_lines, block.shape[1]))
+                elif block.shape[1] != data.shape[1]:
+                    raise ValueError(f"{filename}: {block.shape[1]} columns after row {n_rows}, "
+                                     f"expected {data.shape[1]}")
+                data[n_rows:n_rows + len(block)] = block
+                n_rows += len(block)
+
+    if data is None:
+        raise ValueError(f"{filename} has no data rows")
+    data = data[:n_rows]  # blank lines
+    if np.isnan(data).any():
+        row = int(np.flatnonzero(np.isnan(data).any(axis=1))[0])
+        raise ValueError(f"{filename}: missing or non-numeric value in data row {row + 1}")
+    if use_cache:
+        save_arrays(filename, {'data': data}, key)
+    return data
@@ -0,0 +1,169 @@
+"""
+Batched harmonic tidal analysis and detiding of water-level records.
+
+Each record is fitted by least squares with
+
+    h(t) = mean + sum_k A_k cos(w_k t - g_k)
+
+for a set of constituents (angular speeds in degrees per hour, phases g_k
+relative to the epoch, no nodal corrections). The design matrix is built
+once for the shared time axis. Stations with complete records are solved
+together with one factorization (np.linalg.lstsq with many right-hand
+sides); stations with gaps are grouped by their missing-data pattern and
+each group is solved the same way on its own rows.
+
+Constituents that the record is too short to separate from a more
+important one (Rayleigh criterion) are dropped before fitting, so a
+two-day storm record is fitted with M2/K1/M4-type terms only instead of an
+ill-conditioned full set.
+"""
+
+import numpy as np
+
+from time_encoding import to_datetime64
+
+# Angular speeds in degrees per hour
+CONSTITUENTS = {
+    'M2': 28.9841042, 'S2': 30.0000000, 'N2': 28.4397295, 'K2': 30.0821373,
+    'K1': 15.0410686, 'O1': 13.9430356, 'P1': 14.9589314, 'Q1': 13.3986609,
+    'M4': 57.9682084, 'MS4': 58.9841042, 'MN4': 57.4238337, 'M6': 86.9523127,
+    'MK3': 44.0251729, 'S4': 60.0000000, 'Mf': 1.0980331, 'Mm': 0.5443747,
+    'Ssa': 0.0821373, 'Sa': 0.0410686,
+}
+
+# In order of priority for the Rayleigh selection
+DEFAULT_CONSTITUENTS = ('M2', 'K1', 'S2', 'O1', 'N2', 'K2', 'P1', 'Q1', 'M4', 'MS4', 'MN4',
+                        'M6', 'MK3', 'S4')
+
+
+def resolvable(constituents, duration_hours, rayleigh=1.0):
+    """
+    Constituents (in priority order) separable over duration_hours: each
+    kept one differs in frequency from every earlier kept one, and from
+    zero frequency, by at least rayleigh / duration.
+    """
+    min_separation = rayleigh * 360.0 / duration_hours  # degrees per hour
+    kept = []
+    for name in constituents:
+        speed = CONSTITUENTS[name]
+        if speed < min_separation:
+            continue
+        if all(abs(speed - CONSTITUENTS[other]) >= min_separation for other in kept):
+            kept.append(name)
+    return kept
+
+
+def _hours(times, epoch):
+    seconds = (to_datetime64(times) - to_datetime64(epoch)).astype(np.int64)
+    return seconds / 3600.0
+
+
+def design_matrix(hours, constituents):
+    """
+    (n_times, 1 + 2 * n_constituents) columns [1, cos(w t), sin(w t), ...].
+    """
+    speeds = np.deg2rad([CONSTITUENTS[name] for name in constituents])
+    phase = np.outer(hours, speeds)
+    columns = np.empty((len(hours), 1 + 2 * len(speeds)))
+    columns[:, 0] = 1.0
+    columns[:, 1::2] = np.cos(phase)
+    columns[:, 2::2] = np.sin(phase)
+    return columns
+
+
+def harmonic_analysis(times, values, constituents=DEFAULT_CONSTITUENTS, epoch=None, rayleigh=1.0):
+    """
+    Fit tidal constituents to one or many water-level records.
+
+    Parameters:
+    -----------
+    times : array-like
+        (n_times,) shared time axis
+    values : array-like
+        (n_times,) or (n_station, n_times) water levels, NaN where missing
+    constituents : sequence of str
+        Candidate constituents, in priority order
+    epoch : datetime-like, optional
+        Phase reference (default: the first time)
+    rayleigh : float or None
+        Rayleigh criterion for dropping unresolvable constituents; None
+        keeps them all
+
+    Returns:
+    --------
+    dict
+        'constituents' (list), 'amplitude' and 'phase' (degrees, 0-360)
+        as (n_station, n_constituents), 'mean' (n_station,), 'tide'
+        (predicted, no gaps) and 'residual' (values - tide, NaN in gaps),
+        shaped like values; NaN rows for stations with too few points
+    """
+    times = to_datetime64(times)
+    values = np.asarray(values, dtype=np.float64)
+    single = values.ndim == 1
+    values = np.atleast_2d(values)
+    if values.shape[1] != len(times):
+        raise ValueError(f"{values.shape[1]} values per station for {len(times)} times")
+
+    epoch = times[0] if epoch is None else epoch
+    hours = _hours(times, epoch)
+    duration = hours[-1] - hours[0]
+    if rayleigh is not None:
+        kept = resolvable(constituents, duration, rayleigh)
+        dropped = [name for name in constituents if name not in kept]
+        if dropped:
+            print(f"Record of {duration:.0f} h cannot resolve {', '.join(dropped)}; "
+                  f"fitting {', '.join(kept)}")
+        constituents = kept
+    constituents = list(constituents)
+    if not constituents:
+        raise ValueError(f"No constituent can be resolved from a {duration:.0f} h record")
+
+    X = design_matrix(hours, constituents)
+    n_params = X.shape[1]
+    coef = np.full((values.shape[0], n_params), np.nan)
+
+    # One least-squares solve per distinct missing-data pattern
+    valid = np.isfinite(values)
+    patterns, group = np.unique(valid, axis=0, return_inverse=True)
+    for p, rows in enumerate(patterns):
+        stations = np.flatnonzero(group.ravel() == p)
+        if rows.sum() < n_params:
+            print(f"Warning: {len(stations)} stations have {int(rows.sum())} points for "
+                  f"{n_params} parameters, not fitted")
+            continue
+        solution, *_ = np.linalg.lstsq(X[rows], values[stations][:, rows].T, rcond=None)
+        coef[stations] = solution.T
+
+    a, b = coef[:, 1::2], coef[:, 2::2]
+    tide = coef @ X.T
+    result = {
+        'constituents': constituents,
+        'amplitude': np.hypot(a, b),
+        'phase': np.rad2deg(np.arctan2(b, a)) % 360.0,
+        'mean': coef[:, 0],
+        'tide': tide,
+        'residual': values - tide,
+    }
+    if single:
+        for key in ('amplitude', 'phase', 'tide', 'residual'):
+            result[key] = result[key][0]
+        result['mean'] = result['mean'][0]
+    return result
+
+
+def predict(times, constituents, amplitude, phase, mean=0.0, epoch=None):
+    """
+    Tide from fitted constituents at times (e.g. to extend a fit past the record).
+    epoch must match the one used for the fit (default: the first time).
+    """
+    times = to_datetime64(times)
+    epoch = times[0] if epoch is None else epoch
+    X = design_matrix(_hours(times, epoch), constituents)
+    amplitude = np.atleast_2d(amplitude)
+    g = np.deg2rad(np.atleast_2d(phase))
+    coef = np.empty((amplitude.shape[0], X.shape[1]))
+    coef[:, 0] = mean
+    coef[:, 1::2] = amplitude * np.cos(g)
+    coef[:, 2::2] = amplitude * np.sin(g)
+    tide = coef @ X.T
+    return tide[0] if np.ndim(phase) == 1 else tide
@@ -0,0 +1,80 @@
+"""
+Time-axis conversions shared by the ERA5 and observation scripts.
+
+Three encodings show up in this repository:
+  - ERA5 valid_time: seconds since 1970-01-01 (int64), or the same values
+    already decoded by xarray to datetime64
+  - numpy datetime64
+  - CF "hours since 1900-01-01 00:00:00.0" used by the ESMF/CDO forcing files
+
+All conversions are integer array arithmetic on whole axes, no per-record
+Timestamp objects.
+"""
+
+import numpy as np
+
+UNIX_EPOCH = np.datetime64('1970-01-01T00:00:00', 's')
+CF_1900_EPOCH = np.datetime64('1900-01-01T00:00:00', 's')
+
+SECONDS_SINCE_1970_UNITS = 'seconds since 1970-01-01'
+HOURS_SINCE_1900_UNITS = 'hours since 1900-01-01 00:00:00.0'
+
+# Seconds between 1900-01-01 and 1970-01-01
+EPOCH_OFFSET_1900 = int((UNIX_EPOCH - CF_1900_EPOCH).astype(np.int64))
+
+
+def to_datetime64(times):
+    """
+    Return times as datetime64[s].
+
+    Accepts datetime64 of any resolution (e.g. decoded valid_time), ISO
+    strings, or integer/float seconds since 1970-01-01 (raw valid_time).
+    """
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        return times.astype('datetime64[s]')
+    if times.dtype.kind in 'USO':
+        return times.astype('datetime64[s]')
+    return seconds_since_1970_to_datetime64(times)
+
+
+def seconds_since_1970_to_datetime64(seconds):
+    """
+    Convert seconds since 1970-01-01 to datetime64[s].
+    """
+    return np.asarray(seconds).astype(np.int64).astype('datetime64[s]')
+
+
+def datetime64_to_seconds_since_1970(times):
+    """
+    Convert datetime64 (or raw valid_time) to int64 seconds since 1970-01-01.
+    """
+    return to_datetime64(times).astype(np.int64)
+
+
+def datetime64_to_hours_since_1900(times, dtype=np.int32):
+    """
+    Convert datetime64 (or raw valid_time) to CF hours since 1900-01-01.
+
+    Sub-hour offsets are truncated, matching the int32 forcing time axis.
+    """
+    seconds = datetime64_to_seconds_since_1970(times) + EPOCH_OFFSET_1900
+    return (seconds // 3600).astype(dtype)
+
+
+def hours_since_1900_to_datetime64(hours):
+    """
+    Convert CF hours since 1900-01-01 to datetime64[s].
+    """
+    seconds = np.asarray(hours).astype(np.int64) * 3600 - EPOCH_OFFSET_1900
+    return seconds.astype('datetime64[s]')
+
+
+def regular_time_axis(start, end, step_seconds):
+    """
+    Regular datetime64[s] axis from start to end inclusive with a fixed step.
+    """
+    start = to_datetime64(start)
+    end = to_datetime64(end)
+    n_steps = int((end - start).astype(np.int64) // step_seconds) + 1
+    return start + np.arange(n_steps, dtype=np.int64) * np.timedelta64(int(step_seconds), 's')
@@ -0,0 +1,279 @@
+"""
+Time alignment of observation series to model/forcing time axes.
+
+Observation timestamps (as read by obs_io) are converted once to
+datetime64 vectors and matched to the output times with searchsorted, so
+aligning n_obs records to n_out times is O((n_obs + n_out) log n_obs)
+with no per-step Python loop.
+Output steps outside the observation record, or inside a gap longer than
+max_gap, are masked instead of wrapping around to other records.
+
+TemporalResampler uses the same bracketing to refine gridded forcing
+(e.g. hourly ERA5 to 10/15/30 minutes) block by block.
+"""
+
+import numpy as np
+
+from time_encoding import to_datetime64, datetime64_to_seconds_since_1970
+
+
+def _as_seconds(times):
+    return datetime64_to_seconds_since_1970(times)
+
+
+def prepare_series(obs_times, values):
+    """
+    Sort observations by time, drop duplicate timestamps (first one wins)
+    and drop records with a non-finite value in any column.
+
+    Returns (seconds since 1970 as int64, values with time as first axis).
+    """
+    seconds = _as_seconds(obs_times)
+    values = np.asarray(values, dtype=np.float64)
+    if len(seconds) != len(values):
+        raise ValueError(f"{len(seconds)} timestamps for {len(values)} observation records")
+
+    if np.any(np.diff(seconds) <= 0):
+        seconds, first = np.unique(seconds, return_index=True)
+        values = values[first]
+
+    finite = np.isfinite(values.reshape(len(values), -1)).all(axis=1)
+    return seconds[finite], values[finite]
+
+
+def bracket(source_seconds, target_seconds):
+    """
+    Locate each target time between two sorted source times.
+
+    Returns (left, weight, inside, gap): source index left of each target,
+    linear weight of source[left + 1], whether the target lies within the
+    source record, and the source spacing around it in seconds. A target
+    equal to a source time gets that index with weight 0.
+    """
+    source_seconds = np.asarray(source_seconds, dtype=np.int64)
+    target_seconds = np.asarray(target_seconds, dtype=np.int64)
+    n_source = len(source_seconds)
+    if n_source == 0:
+        raise ValueError("No source times to interpolate from")
+    if n_source == 1:
+        zero = np.zeros(len(target_seconds), dtype=np.intp)
+        return (zero, np.zeros(len(target_seconds)),
+                target_seconds == source_seconds[0], np.zeros(len(target_seconds), dtype=np.int64))
+
+    left = np.searchsorted(source_seconds, target_seconds, side='right') - 1
+    left = np.clip(left, 0, n_source - 2)
+    t0 = source_seconds[left]
+    gap = source_seconds[left + 1] - t0
+    weight = (target_seconds - t0) / gap
+    inside = (target_seconds >= source_seconds[0]) & (target_seconds <= source_seconds[-1])
+    return left, weight, inside, gap
+
+
+def interpolate_series(obs_times, values, target_times, max_gap=None):
+    """
+    Linearly interpolate observations to target times.
+
+    Parameters:
+    -----------
+    obs_times : array-like
+        Observation timestamps (datetime64, or seconds since 1970)
+    values : array-like
+        Observation values with time as the first axis (e.g. column_stack of u, v)
+    target_times : array-like
+        Output timestamps
+    max_gap : float or None
+        Largest spacing in seconds between the two observations used for a
+        target; steps inside longer gaps are masked. Targets that coincide
+        with an observation are always kept
+
+    Returns:
+    --------
+    result : numpy.ndarray
+        Interpolated values, NaN where masked
+    valid : numpy.ndarray of bool
+        Steps with an observation-based value
+    """
+    seconds, values = prepare_series(obs_times, values)
+    target_seconds = _as_seconds(target_times)
+    if len(seconds) == 0:
+        result = np.full((len(target_seconds),) + values.shape[1:], np.nan)
+        return result, np.zeros(len(target_seconds), dtype=bool)
+
+    left, weight, inside, gap = bracket(seconds, target_seconds)
+    right = np.minimum(left + 1, len(seconds) - 1)
+    exact = (seconds[left] == target_seconds) | (seconds[right] == target_seconds)
+
+    valid = inside.copy()
+    if max_gap is not None:
+        valid &= (gap <= max_gap) | exact
+
+    weight = weight.reshape((-1,) + (1,) * (values.ndim - 1))
+    result = values[left] * (1 - weight) + values[right] * weight
+    result[~valid] = np.nan
+    return result, valid
+
+
+def check_alignment(obs_times, target_times, valid, label='Observations'):
+    """
+    Report how much of the target axis the observations cover.
+
+    Raises ValueError when no target step is covered (the records do not
+    overlap the output window at all); otherwise prints a warning with the
+    masked step count and returns the covered fraction.
+    """
+    obs_times = to_datetime64(obs_times)
+    target_times = to_datetime64(target_times)
+    n_valid = int(np.count_nonzero(valid))
+    if n_valid == 0:
+        raise ValueError(f"{label} ({obs_times.min()} to {obs_times.max()}) do not overlap "
+                         f"the output window ({target_times[0]} to {target_times[-1]})")
+    if n_valid < len(target_times):
+        masked = np.flatnonzero(~valid)
+        print(f"Warning: {label} cover {n_valid}/{len(target_times)} output steps; "
+              f"{len(masked)} steps masked (first {target_times[masked[0]]}, "
+              f"last {target_times[masked[-1]]})")
+    return n_valid / len(target_times)
+
+
+class TemporalResampler:
+    """
+    Resample gridded fields from one time axis to another, block by block.
+
+    Interpolation positions (source interval and weight of every target
+    time) are computed once from the two axes. Data are only touched by
+    apply/blocks, which read the few source records each target block
+    needs, so input and output never have to be held in memory whole.
+
+    Parameters:
+    -----------
+    source_times : array-like
+        Input time axis (datetime64 or seconds since 1970), increasing
+    target_times : array-like
+        Output time axis, any spacing (e.g. 10, 15 or 30 minutes), within
+        the source range
+    method : str
+        'linear', or 'pchip' for monotone piecewise cubic Hermite
+        interpolation (no overshoot between records)
+    """
+
+    METHODS = ('linear', 'pchip')
+
+    def __init__(self, source_times, target_times, method='linear'):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {self.METHODS}")
+        self.method = method
+        self.source_seconds = _as_seconds(source_times)
+        self.target_seconds = _as_seconds(target_times)
+        if len(self.source_seconds) < 2:
+            raise ValueError("At least two source times are needed to resample")
+        if np.any(np.diff(self.source_seconds) <= 0):
+            raise ValueError("Source times must be strictly increasing")
+
+        self.left, self.weight, inside, _ = bracket(self.source_seconds, self.target_seconds)
+        if not inside.all():
+            raise ValueError(f"{int((~inside).sum())} target times fall outside the source "
+                             f"range; extrapolation is not supported")
+
+        # Hermite basis on each target's interval (pchip); derivatives depend on
+        # the data and are computed per block
+        self.spacing = np.diff(self.source_seconds).astype(np.float64)
+        if method == 'pchip':
+            s = self.weight
+            h = self.spacing[self.left]
+            self.basis = (2 * s**3 - 3 * s**2 + 1,
+                          (s**3 - 2 * s**2 + s) * h,
+                          -2 * s**3 + 3 * s**2,
+                          (s**3 - s**2) * h)
+
+    def __len__(self):
+        return len(self.target_seconds)
+
+    def source_window(self, start, stop):
+        """
+        Slice of source records needed for target records start:stop.
+        """
+        first = int(self.left[start])
+        last = int(self.left[stop - 1]) + 1
+        if self.method == 'pchip':
+            # Derivatives at an interval's ends use one more record on each side
+            first -= 1
+            last += 1
+        return slice(max(first, 0), min(last, len(self.source_seconds) - 1) + 1)
+
+    def apply(self, block, window, start, stop):
+        """
+        Resample target records start:stop from block = source[window]
+        (time on the first axis). Returns a float array.
+        """
+        block = np.asarray(block)
+        left = self.left[start:stop] - window.start
+        shape = (-1,) + (1,) * (block.ndim - 1)
+
+        if self.method == 'linear':
+            weight = self.weight[start:stop].reshape(shape)
+            return block[left] * (1 - weight) + block[left + 1] * weight
+
+        slopes = _pchip_derivatives(block, self.spacing[window.start:window.stop - 1],
+                                    window.start == 0,
+                                    window.stop == len(self.source_seconds))
+        h00, h10, h01, h11 = (b[start:stop].reshape(shape) for b in self.basis)
+        return (h00 * block[left] + h10 * slopes[left]
+                + h01 * block[left + 1] + h11 * slopes[left + 1])
+
+    def blocks(self, data_array, time_dim, block_size=24, dtype=np.float32):
+        """
+        Yield (start, stop, values) output blocks of block_size target records,
+        reading only the matching source records from data_array.
+        """
+        n_targets = len(self)
+        for start in range(0, n_targets, block_size):
+            stop = min(start + block_size, n_targets)
+            window = self.source_window(start, stop)
+            block = data_array.isel({time_dim: window}).values
+            yield start, stop, self.apply(block, window, start, stop).astype(dtype, copy=False)
+
+
+def _pchip_derivatives(values, spacing, starts_series, ends_series):
+    """
+    Fritsch-Carlson derivatives of a monotone cubic through values (time on
+    the first axis), as in scipy.interpolate.PchipInterpolator.
+
+    spacing holds the len(values) - 1 time steps. Window edges that are not
+    the ends of the whole series are left NaN; source_window never asks for
+    them.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    shape = (-1,) + (1,) * (values.ndim - 1)
+    h = spacing.reshape(shape)
+    delta = np.diff(values, axis=0) / h
+    slopes = np.full(values.shape, np.nan)
+
+    if len(values) == 2:
+        slopes[:] = delta[0]
+        return slopes
+
+    # Interior points: weighted harmonic mean of neighbouring slopes, zero at extrema
+    h0, h1 = h[:-1], h[1:]
+    d0, d1 = delta[:-1], delta[1:]
+    w1 = 2 * h1 + h0
+    w2 = h1 + 2 * h0
+    same_sign = (np.sign(d0) * np.sign(d1)) > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        harmonic = (w1 + w2) / (w1 / d0 + w2 / d1)
+    slopes[1:-1] = np.where(same_sign, harmonic, 0.0)
+
+    if starts_series:
+        slopes[0] = _pchip_end_slope(h[0], h[1], delta[0], delta[1])
+    if ends_series:
+        slopes[-1] = _pchip_end_slope(h[-1], h[-2], delta[-1], delta[-2])
+    return slopes
+
+
+def _pchip_end_slope(h0, h1, d0, d1):
+    """
+    One-sided three-point end derivative, limited to keep the curve monotone.
+    """
+    slope = ((2 * h0 + h1) * d0 - h0 * d1) / (h0 + h1)
+    slope = np.where(np.sign(slope) != np.sign(d0), 0.0, slope)
+    overshoot = (np.sign(d0) != np.sign(d1)) & (np.abs(slope) > np.abs(3 * d0))
+    return np.where(overshoot, 3 * d0, slope)
@@ -0,0 +1,105 @@
+"""
+Wind speed/direction to u/v conversion for observation ingestion.
+
+Directions follow the meteorological convention (degrees the wind blows
+FROM, clockwise from north), the same as MetPy's wind_components. Every
+function works on whole columns in one NumPy call; no pint Quantities.
+
+Station-driven winds are one value per time step over the whole grid, so
+they are kept as per-time series, exposed as broadcast views
+(uniform_field) and only expanded slab by slab when written
+(forcing_writer.write_forcing).
+"""
+
+import numpy as np
+
+MAX_WIND_SPEED = 100.0  # m/s, upper bound of a plausible 10 m wind
+
+
+def wind_components(speed, direction, clip=True, max_speed=MAX_WIND_SPEED):
+    """
+    Calculate U and V components from wind speed and direction arrays.
+
+    Parameters:
+    -----------
+    speed : array-like
+        Wind speed in m/s
+    direction : array-like
+        Meteorological wind direction in degrees
+    clip : bool
+        Clip speed to [0, max_speed] and direction to [0, 360]. When False,
+        values outside those ranges raise ValueError instead
+    max_speed : float
+        Upper speed bound in m/s
+
+    Returns:
+    --------
+    u, v : numpy.ndarray
+        Eastward and northward components (float64, NaN where an input is NaN)
+    """
+    speed = np.asarray(speed, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)
+    if speed.shape != direction.shape:
+        raise ValueError(f"speed {speed.shape} and direction {direction.shape} "
+                         f"must have the same shape")
+
+    if clip:
+        speed = np.clip(speed, 0, max_speed)
+        direction = np.clip(direction, 0, 360)
+    else:
+        with np.errstate(invalid='ignore'):
+            bad = (speed < 0) | (speed > max_speed) | (direction < 0) | (direction > 360)
+        if bad.any():
+            first = int(np.flatnonzero(bad.ravel())[0])
+            raise ValueError(f"{int(bad.sum())} wind records out of range, first at index "
+                             f"{first}: speed={speed.ravel()[first]}, "
+                             f"direction={direction.ravel()[first]}")
+
+    radians = np.deg2rad(direction)
+    u = -speed * np.sin(radians)
+    v = -speed * np.cos(radians)
+    return u, v
+
+
+def check_against_metpy(speed, direction, clip=True, atol=1e-6):
+    """
+    Compare wind_components with metpy.calc.wind_components on the same
+    arrays and return the largest absolute difference.
+
+    Returns None (with a message) when MetPy is not installed; raises
+    ValueError if the two disagree by more than atol.
+    """
+    try:
+        from metpy.calc import wind_components as metpy_wind_components
+        from metpy.units import units
+    except ImportError:
+        print("MetPy not installed, skipping wind component check")
+        return None
+
+    u, v = wind_components(speed, direction, clip=clip)
+
+    speed = np.asarray(speed, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)
+    if clip:
+        speed = np.clip(speed, 0, MAX_WIND_SPEED)
+        direction = np.clip(direction, 0, 360)
+    u_ref, v_ref = metpy_wind_components(speed * units('m/s'), direction * units('degrees'))
+    u_ref = np.asarray(u_ref.to('m/s').magnitude)
+    v_ref = np.asarray(v_ref.to('m/s').magnitude)
+
+    diff = max(np.nanmax(np.abs(u - u_ref), initial=0.0),
+               np.nanmax(np.abs(v - v_ref), initial=0.0))
+    if diff > atol:
+        raise ValueError(f"Wind components differ from MetPy by {diff:.3g} m/s")
+    print(f"Wind components match MetPy (max difference {diff:.3g} m/s)")
+    return diff
+
+
+def uniform_field(series, grid_shape, dtype=np.float32):
+    """
+    Read-only (time, lat, lon) view of a per-time series repeated over the
+    grid. Nothing is allocated beyond the series itself.
+    """
+    series = np.asarray(series, dtype=dtype)
+    return np.broadcast_to(series[:, None, None], (len(series),) + tuple(grid_shape))
+